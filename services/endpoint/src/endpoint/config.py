@@ -1,5 +1,9 @@
+import importlib.util
+import socket
 from pathlib import Path
+from typing import Literal
 
+from pydantic import Field, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,7 +13,48 @@ class Settings(BaseSettings):
     rabbitmq_queue: str
 
     port: int = 8080
-    num_workers: int = 2
+    # The count is kept in each process's memory, so more than one worker
+    # means each worker answers with its own count.
+    num_workers: int = Field(default=1, ge=1)
+
+    # Server tuning, passed on to uvicorn.
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    timeout_keep_alive: int = Field(default=5, ge=0)
+    backlog: int = Field(default=2048, ge=1)
+    limit_concurrency: int | None = Field(default=None, ge=1)
+    access_log: bool = True
+
+    # Give each worker its own SO_REUSEPORT socket so the kernel spreads
+    # connections across them, instead of sharing one listening socket.
+    reuse_port: bool = False
+
+    # Increments are rejected with a 503 while this many publishes are still
+    # pending, asking clients to retry after `publish_retry_after` seconds.
+    # This is counted per worker, so the cap of the whole server is
+    # `num_workers * max_pending_publishes`.
+    max_pending_publishes: int = Field(default=1000, ge=1)
+    publish_retry_after: int = Field(default=1, ge=0)
+
+    # The most a single bulk increment may add to the count.
+    max_bulk_increment: int = Field(default=10_000, ge=1)
+
+    enable_admin_routes: bool = False
+
+    @field_validator("loop", "http")
+    @classmethod
+    def check_installed(cls, value: str) -> str:
+        if value in ("uvloop", "httptools") and (
+            importlib.util.find_spec(value) is None
+        ):
+            raise ValueError(f"'{value}' is selected but not installed")
+        return value
+
+    @model_validator(mode="after")
+    def check_reuse_port(self) -> "Settings":
+        if self.reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("SO_REUSEPORT is not supported on this platform")
+        return self
 
 
 settings = Settings(_env_file=Path(__file__).parents[2] / ".env")  # noqa
@@ -1,23 +1,137 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from logging import getLogger
 from typing import Annotated
 
-from fastapi import FastAPI, Header, BackgroundTasks
+from fastapi import FastAPI, Header, BackgroundTasks, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from commons.profiling import install_profiler_signal, loop_monitor, profiler
 from commons.rabbitmq_utils import send_to_exchange
+from commons.tracing import (
+    is_valid_trace_id,
+    latency_snapshot,
+    new_trace_id,
+    observe_latency,
+    received_at_var,
+    trace_id_var,
+)
 from endpoint.config import settings
 
 
 logger = getLogger(__name__)
 num_calls = 0
+pending_publishes = 0
 
 
 class Count(BaseModel):
     count: int
 
 
-app = FastAPI(title="Counting API", summary="Counts the number of calls made.")
+class IncrementEvent(BaseModel):
+    amount: int = Field(default=1, gt=0)
+
+
+class BulkIncrement(BaseModel):
+    """Either a number of increments or a list of increment events."""
+
+    count: int | None = Field(default=None, gt=0)
+    events: list[IncrementEvent] | None = Field(
+        default=None, min_length=1, max_length=settings.max_bulk_increment
+    )
+
+    @model_validator(mode="after")
+    def check_exactly_one(self) -> "BulkIncrement":
+        if (self.count is None) == (self.events is None):
+            raise ValueError("Exactly one of 'count' or 'events' must be set")
+        return self
+
+    @model_validator(mode="after")
+    def check_total(self) -> "BulkIncrement":
+        if self.total > settings.max_bulk_increment:
+            raise ValueError(
+                f"A bulk increment may add at most "
+                f"{settings.max_bulk_increment}"
+            )
+        return self
+
+    @property
+    def total(self) -> int:
+        if self.count is not None:
+            return self.count
+        return sum(event.amount for event in self.events)
+
+
+class BulkCount(Count):
+    increment: int
+
+
+class PublishStatus(BaseModel):
+    pending: int
+    limit: int
+    saturated: bool
+
+
+class ProfileDump(BaseModel):
+    path: str | None
+
+
+class TraceMiddleware:
+    """Sets a trace id for each request so it follows the published message.
+
+    An incoming `X-Trace-Id` header is reused if it is a short hex string or a
+    UUID, otherwise a new id is made. The id is returned in the `X-Trace-Id`
+    response header. The time the request was received is kept as well, to
+    measure how long it takes to publish.
+
+    This is a plain ASGI middleware since `@app.middleware("http")` runs each
+    request through extra tasks and streams, which slows every increment.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = Headers(scope=scope).get("x-trace-id")
+        if trace_id is None or not is_valid_trace_id(trace_id):
+            trace_id = new_trace_id()
+
+        async def send_with_trace_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Trace-Id", trace_id)
+            await send(message)
+
+        trace_token = trace_id_var.set(trace_id)
+        received_token = received_at_var.set(time.time_ns())
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            received_at_var.reset(received_token)
+            trace_id_var.reset(trace_token)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    loop_monitor.start()
+    install_profiler_signal()
+    yield
+    loop_monitor.stop()
+    await asyncio.to_thread(profiler.stop)
+
+
+app = FastAPI(
+    title="Counting API",
+    summary="Counts the number of calls made.",
+    lifespan=lifespan,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,6 +140,58 @@ app.add_middleware(
     allow_headers=["*"],
     max_age=3600,
 )
+app.add_middleware(TraceMiddleware)
+
+
+def admit_publish():
+    """Reserves a slot for a publish, or sheds the request if there is none.
+
+    Raises:
+        HTTPException: 503 with a Retry-After header if the number of pending
+            publishes has reached `max_pending_publishes`.
+    """
+    global pending_publishes
+
+    if pending_publishes >= settings.max_pending_publishes:
+        logger.warning(f"Shedding request with {pending_publishes=}")
+        raise HTTPException(
+            status_code=503,
+            detail="Too many pending publishes",
+            headers={"Retry-After": str(settings.publish_retry_after)},
+        )
+    pending_publishes += 1
+
+
+def client_key(request: Request, x_real_ip: str | None) -> str | None:
+    """Gets the key that partitions a client's increments.
+
+    This is the client's address, taken from `X-Real-IP` when the request went
+    through the proxy, so the increments of one client stay in order while the
+    increments of different clients are spread over the partitions.
+    """
+    if x_real_ip:
+        return x_real_ip
+    return request.client.host if request.client else None
+
+
+async def publish(message: str, routing_key: str, partition_key: str | None):
+    """Publishes a message and releases its slot reserved by admit_publish."""
+    global pending_publishes
+
+    received_at = received_at_var.get()
+    if received_at is not None:
+        observe_latency(
+            routing_key,
+            "request_to_publish",
+            (time.time_ns() - received_at) / 1e9,
+        )
+
+    try:
+        await send_to_exchange(
+            message, routing_key, partition_key=partition_key
+        )
+    finally:
+        pending_publishes -= 1
 
 
 @app.get("/api/count")
@@ -38,6 +204,7 @@ def get_count(x_real_ip: Annotated[str | None, Header()] = None) -> Count:
 
 @app.post("/api/count/increment")
 async def increment_count(
+    request: Request,
     background_task: BackgroundTasks,
     x_real_ip: Annotated[str | None, Header()] = None,
 ) -> Count:
@@ -47,17 +214,111 @@ async def increment_count(
     logger.info(f"POST to increment {num_calls=}")
     logger.info(f"Request from {x_real_ip}")
 
+    admit_publish()
     num_calls += 1
 
     return_val = Count(count=num_calls)
 
     message = return_val.model_dump_json()
 
-    background_task.add_task(send_to_exchange, message, settings.rabbitmq_queue)
+    background_task.add_task(
+        publish,
+        message,
+        settings.rabbitmq_queue,
+        client_key(request, x_real_ip),
+    )
 
     return return_val
 
 
+@app.post("/api/count/increment/bulk")
+async def bulk_increment_count(
+    increments: BulkIncrement,
+    request: Request,
+    background_task: BackgroundTasks,
+    x_real_ip: Annotated[str | None, Header()] = None,
+) -> Count:
+    """Applies many increments at once and publishes a single event for them.
+
+    The counter is updated in one step, so no other request sees a partially
+    applied bulk increment.
+    """
+    global num_calls
+
+    increment = increments.total
+    logger.info(f"POST to bulk increment {num_calls=} by {increment=}")
+    logger.info(f"Request from {x_real_ip}")
+
+    admit_publish()
+    num_calls += increment
+
+    message = BulkCount(count=num_calls, increment=increment).model_dump_json()
+
+    background_task.add_task(
+        publish,
+        message,
+        settings.rabbitmq_queue,
+        client_key(request, x_real_ip),
+    )
+
+    return Count(count=num_calls)
+
+
+@app.get("/api/publish/status")
+def get_publish_status() -> PublishStatus:
+    """Gets how many publishes are pending and whether requests are shed.
+
+    This only covers the worker that answers the request.
+    """
+    return PublishStatus(
+        pending=pending_publishes,
+        limit=settings.max_pending_publishes,
+        saturated=pending_publishes >= settings.max_pending_publishes,
+    )
+
+
+def require_admin_routes():
+    if not settings.enable_admin_routes:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@app.get("/admin/loop")
+def get_loop_stats() -> dict[str, float]:
+    """Gets the last and maximum measured event loop lag in seconds."""
+    require_admin_routes()
+    return loop_monitor.stats()
+
+
+@app.get("/admin/latency")
+def get_latency() -> dict[str, dict[str, dict]]:
+    """Gets the latency histograms recorded by this worker."""
+    require_admin_routes()
+    return latency_snapshot()
+
+
+@app.post("/admin/profiler/start")
+async def start_profiler() -> ProfileDump:
+    """Starts sampling the event loop thread.
+
+    This is async so it runs on, and samples, the event loop thread.
+    """
+    require_admin_routes()
+    profiler.start()
+    return ProfileDump(path=None)
+
+
+@app.post("/admin/profiler/stop")
+def stop_profiler() -> ProfileDump:
+    """Stops sampling and writes a folded stack dump for flamegraphs.
+
+    This is not async so joining the sampler and writing the dump happen in
+    the threadpool instead of blocking the event loop.
+    """
+    require_admin_routes()
+    path = profiler.stop()
+    return ProfileDump(path=str(path) if path else None)
+
+
 @app.get("/health")
 def read_health() -> dict[str, str]:
     return {"status": "ok"}
@@ -0,0 +1,82 @@
+import logging
+import os
+import signal
+from multiprocessing import Process
+from multiprocessing.connection import wait
+
+
+logger = logging.getLogger(__name__)
+
+
+def worker_exit_status(exitcode: int | None) -> int:
+    """Turns a worker's exit code into a nonzero status for the parent.
+
+    Workers killed by a signal have a negative exit code, which is reported
+    the way shells do, as 128 plus the signal number.
+    """
+    if exitcode is None or exitcode == 0:
+        return 1
+    if exitcode < 0:
+        return 128 - exitcode
+    return exitcode
+
+
+def supervise_workers(workers: list[Process]) -> int:
+    """Starts worker processes and waits until they exit.
+
+    SIGTERM and SIGINT stop all workers, and SIGUSR2 is passed on to each of
+    them. If a worker exits without being told to, the others are stopped
+    too, so the service fails as a whole instead of quietly running with
+    fewer workers.
+
+    Returns:
+        0 if the workers were stopped by a signal, otherwise the nonzero exit
+        status of the first worker that exited on its own.
+    """
+    stopping = False
+
+    def stop_workers():
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    def shutdown(signum, _):
+        nonlocal stopping
+        stopping = True
+        name = signal.Signals(signum).name
+        logger.info(f"Received {name}, stopping workers")
+        stop_workers()
+
+    def toggle_profilers(signum, _):
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signum)
+
+    # Install the handlers first so a signal while starting cannot leave
+    # workers running without a parent.
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    # Each worker toggles its own profiler on SIGUSR2, so pass it on.
+    signal.signal(signal.SIGUSR2, toggle_profilers)
+
+    for worker in workers:
+        if stopping:
+            break
+        worker.start()
+
+    status = 0
+    running = {worker.sentinel: worker for worker in workers if worker.pid}
+    while running:
+        for sentinel in wait(list(running)):
+            worker = running.pop(sentinel)
+            worker.join()
+            if stopping:
+                continue
+            stopping = True
+            status = worker_exit_status(worker.exitcode)
+            logger.error(
+                f"Worker {worker.name} exited with code {worker.exitcode}, "
+                f"stopping the other workers"
+            )
+            stop_workers()
+    return status
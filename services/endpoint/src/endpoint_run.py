@@ -1,13 +1,78 @@
 import logging
+import multiprocessing
+import signal
+import socket
+import sys
+
 import uvicorn
 
 from endpoint.config import settings
+from endpoint.workers import supervise_workers
 from commons.logging.setup_logging import setup_logging
 
 setup_logging(service_name="endpoint", log_level=logging.INFO)
+logger = logging.getLogger(__name__)
 
+HOST = "0.0.0.0"
 
-if __name__ == "__main__":
-    uvicorn.run(
-        "endpoint:app", host="0.0.0.0", port=settings.port, log_config=None
+
+def uvicorn_options() -> dict:
+    return dict(
+        host=HOST,
+        port=settings.port,
+        log_config=None,
+        loop=settings.loop,
+        http=settings.http,
+        timeout_keep_alive=settings.timeout_keep_alive,
+        backlog=settings.backlog,
+        limit_concurrency=settings.limit_concurrency,
+        access_log=settings.access_log,
     )
+
+
+def serve_reuse_port():
+    """Runs a single worker on its own SO_REUSEPORT socket."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, settings.port))
+
+    config = uvicorn.Config("endpoint:app", **uvicorn_options())
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_reuse_port_workers() -> int:
+    """Runs `num_workers` processes that each bind the port with SO_REUSEPORT.
+
+    The kernel balances new connections across the sockets. If a worker dies,
+    the rest are stopped and a nonzero status is returned, so the container
+    can be restarted as a whole.
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=serve_reuse_port, name=f"endpoint-worker-{i}")
+        for i in range(settings.num_workers)
+    ]
+    return supervise_workers(workers)
+
+
+if __name__ == "__main__":
+    logger.info(f"Loading with settings\n{settings.model_dump_json(indent=2)}")
+
+    if settings.num_workers > 1:
+        logger.warning(
+            f"Running {settings.num_workers} workers. The count is kept in "
+            f"memory, so each worker keeps its own count."
+        )
+
+    if settings.reuse_port:
+        sys.exit(run_reuse_port_workers())
+    else:
+        if settings.num_workers > 1:
+            # uvicorn's supervisor does not handle SIGUSR2 and would be killed
+            # by it. Workers install their own handler to toggle the profiler,
+            # so SIGUSR2 must be sent to a worker's PID instead.
+            signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+        uvicorn.run(
+            "endpoint:app", workers=settings.num_workers, **uvicorn_options()
+        )
@@ -8,7 +8,22 @@ from endpoint.config import Settings
 def cleanup_env():
     """Fixture to clean up environment variables before and after each test."""
     # List of environment variables used by the Settings class
-    settings_vars = ["RABBITMQ_QUEUE", "PORT", "NUM_WORKERS"]
+    settings_vars = [
+        "RABBITMQ_QUEUE",
+        "PORT",
+        "NUM_WORKERS",
+        "LOOP",
+        "HTTP",
+        "TIMEOUT_KEEP_ALIVE",
+        "BACKLOG",
+        "LIMIT_CONCURRENCY",
+        "ACCESS_LOG",
+        "REUSE_PORT",
+        "MAX_PENDING_PUBLISHES",
+        "PUBLISH_RETRY_AFTER",
+        "MAX_BULK_INCREMENT",
+        "ENABLE_ADMIN_ROUTES",
+    ]
 
     # Clean up environment variables that might interfere
     original_env = os.environ.copy()
@@ -49,7 +64,17 @@ def test_settings_with_defaults(monkeypatch):
 
     assert settings.rabbitmq_queue == "only_required"
     assert settings.port == 8080  # Default value
-    assert settings.num_workers == 2  # Default value
+    assert settings.num_workers == 1  # Default value
+    assert settings.loop == "auto"  # Default value
+    assert settings.http == "auto"  # Default value
+    assert settings.timeout_keep_alive == 5  # Default value
+    assert settings.backlog == 2048  # Default value
+    assert settings.limit_concurrency is None  # Default value
+    assert settings.reuse_port is False  # Default value
+    assert settings.max_pending_publishes == 1000  # Default value
+    assert settings.publish_retry_after == 1  # Default value
+    assert settings.max_bulk_increment == 10_000  # Default value
+    assert settings.enable_admin_routes is False  # Default value
 
 
 def test_required_setting_missing(monkeypatch):
@@ -80,3 +105,55 @@ def test_extra_settings_are_ignored(monkeypatch):
         settings.EXTRA_ENV_VAR_1
     with pytest.raises(AttributeError):
         settings.YET_ANOTHER
+
+
+def test_server_tuning_from_environment_variables(monkeypatch):
+    """Tests loading the server tuning settings from environment variables."""
+    monkeypatch.setenv("RABBITMQ_QUEUE", "test_queue")
+    monkeypatch.setenv("LOOP", "asyncio")
+    monkeypatch.setenv("HTTP", "h11")
+    monkeypatch.setenv("TIMEOUT_KEEP_ALIVE", "30")
+    monkeypatch.setenv("BACKLOG", "4096")
+    monkeypatch.setenv("LIMIT_CONCURRENCY", "500")
+    monkeypatch.setenv("ACCESS_LOG", "false")
+    monkeypatch.setenv("REUSE_PORT", "true")
+
+    settings = Settings()
+
+    assert settings.loop == "asyncio"
+    assert settings.http == "h11"
+    assert settings.timeout_keep_alive == 30
+    assert settings.backlog == 4096
+    assert settings.limit_concurrency == 500
+    assert settings.access_log is False
+    assert settings.reuse_port is True
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("NUM_WORKERS", "0"),
+        ("LOOP", "trio"),
+        ("HTTP", "h2"),
+        ("TIMEOUT_KEEP_ALIVE", "-1"),
+        ("BACKLOG", "0"),
+        ("LIMIT_CONCURRENCY", "0"),
+    ],
+)
+def test_invalid_server_tuning(monkeypatch, name, value):
+    """Tests that invalid server tuning settings are rejected."""
+    monkeypatch.setenv("RABBITMQ_QUEUE", "test_queue")
+    monkeypatch.setenv(name, value)
+
+    with pytest.raises(ValueError):
+        Settings()
+
+
+def test_uninstalled_loop_is_rejected(monkeypatch, mocker):
+    """Tests that selecting an event loop that is not installed fails."""
+    monkeypatch.setenv("RABBITMQ_QUEUE", "test_queue")
+    monkeypatch.setenv("LOOP", "uvloop")
+    mocker.patch("endpoint.config.importlib.util.find_spec", return_value=None)
+
+    with pytest.raises(ValueError, match="not installed"):
+        Settings()
@@ -2,9 +2,13 @@ import pytest
 from fastapi.testclient import TestClient
 from endpoint.endpoint import app
 import endpoint.endpoint
+from commons.tracing import get_trace_id
+from commons.tracing.tracing import latency_histograms
 
 # Constant for our mocked RabbitMQ queue name
 MOCKED_RABBITMQ_QUEUE = "test_mocked_queue"
+# The client address TestClient makes requests from
+TEST_CLIENT = "testclient"
 
 
 @pytest.fixture(scope="function")
@@ -15,6 +19,7 @@ def client():
     """
     # Reset num_calls before each test run for isolation
     endpoint.endpoint.num_calls = 0
+    endpoint.endpoint.pending_publishes = 0
     yield TestClient(app)
     # Teardown code can go here if needed
 
@@ -79,6 +84,7 @@ def test_increment_count(client, mocker):
     mocked_send_function.assert_called_once_with(
         expected_rabbitmq_message,
         MOCKED_RABBITMQ_QUEUE,
+        partition_key=TEST_CLIENT,
     )
 
     # Check count via GET to ensure state change
@@ -107,7 +113,9 @@ def test_increment_count_with_x_real_ip(client, mocker):
     assert response.json() == expected_response_data
 
     mocked_send_function.assert_called_once_with(
-        '{"count":' + str(expected_count) + "}", MOCKED_RABBITMQ_QUEUE
+        '{"count":' + str(expected_count) + "}",
+        MOCKED_RABBITMQ_QUEUE,
+        partition_key="10.0.0.1",
     )
 
 
@@ -125,13 +133,13 @@ def test_get_count_after_multiple_increments(client, mocker):
     # First increment
     client.post("/api/count/increment")
     mocked_send_function.assert_called_with(
-        '{"count":1}', MOCKED_RABBITMQ_QUEUE
+        '{"count":1}', MOCKED_RABBITMQ_QUEUE, partition_key=TEST_CLIENT
     )
 
     # Second increment
     client.post("/api/count/increment")  # num_calls becomes 2
     mocked_send_function.assert_called_with(
-        '{"count":2}', MOCKED_RABBITMQ_QUEUE
+        '{"count":2}', MOCKED_RABBITMQ_QUEUE, partition_key=TEST_CLIENT
     )
 
     # Check final count
@@ -164,7 +172,7 @@ def test_increment_and_get_sequence(client, mocker):
     assert response_post1.json() == {"count": 1}
     # Check that send_to_exchange was called with the latest values
     mocked_send_function.assert_called_with(
-        '{"count":1}', MOCKED_RABBITMQ_QUEUE
+        '{"count":1}', MOCKED_RABBITMQ_QUEUE, partition_key=TEST_CLIENT
     )
 
     # 2. Get count again
@@ -179,7 +187,7 @@ def test_increment_and_get_sequence(client, mocker):
     assert response_post2.status_code == 200
     assert response_post2.json() == {"count": 2}
     mocked_send_function.assert_called_with(
-        '{"count":2}', MOCKED_RABBITMQ_QUEUE
+        '{"count":2}', MOCKED_RABBITMQ_QUEUE, partition_key="test-ip-123"
     )
 
     # 4. Final get count
@@ -191,3 +199,257 @@ def test_increment_and_get_sequence(client, mocker):
 
     # Verify total calls to send_to_exchange
     assert mocked_send_function.call_count == 2
+
+
+def test_bulk_increment_with_count(client, mocker):
+    """
+    Test POST /api/count/increment/bulk with a count. It should apply all
+    increments at once and publish a single aggregated message.
+    """
+    mocked_send_function = mocker.patch("endpoint.endpoint.send_to_exchange")
+    mocker.patch(
+        "endpoint.endpoint.settings.rabbitmq_queue", MOCKED_RABBITMQ_QUEUE
+    )
+
+    client.post("/api/count/increment")
+    response = client.post("/api/count/increment/bulk", json={"count": 1000})
+    assert response.status_code == 200
+    assert response.json() == {"count": 1001}
+
+    mocked_send_function.assert_called_with(
+        '{"count":1001,"increment":1000}',
+        MOCKED_RABBITMQ_QUEUE,
+        partition_key=TEST_CLIENT,
+    )
+    assert mocked_send_function.call_count == 2
+
+    response_get = client.get("/api/count")
+    assert response_get.json() == {"count": 1001}
+
+
+def test_bulk_increment_with_events(client, mocker):
+    """
+    Test POST /api/count/increment/bulk with a list of increment events.
+    Events without an amount count as a single increment.
+    """
+    mocked_send_function = mocker.patch("endpoint.endpoint.send_to_exchange")
+    mocker.patch(
+        "endpoint.endpoint.settings.rabbitmq_queue", MOCKED_RABBITMQ_QUEUE
+    )
+
+    response = client.post(
+        "/api/count/increment/bulk",
+        json={"events": [{}, {"amount": 3}, {"amount": 2}]},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 6}
+
+    mocked_send_function.assert_called_once_with(
+        '{"count":6,"increment":6}',
+        MOCKED_RABBITMQ_QUEUE,
+        partition_key=TEST_CLIENT,
+    )
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"count": 1, "events": [{}]},
+        {"count": 0},
+        {"events": []},
+        {"events": [{"amount": -1}]},
+        {"count": 10_001},
+        {"events": [{}] * 10_001},
+        {"events": [{"amount": 5_000}, {"amount": 5_001}]},
+    ],
+)
+def test_bulk_increment_invalid_body(client, mocker, body):
+    """Test that invalid bulk increments are rejected without side effects."""
+    mocked_send_function = mocker.patch("endpoint.endpoint.send_to_exchange")
+
+    response = client.post("/api/count/increment/bulk", json=body)
+    assert response.status_code == 422
+
+    mocked_send_function.assert_not_called()
+    assert client.get("/api/count").json() == {"count": 0}
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/api/count/increment", None),
+        ("/api/count/increment/bulk", {"count": 5}),
+    ],
+)
+def test_increment_shed_when_saturated(client, mocker, path, body):
+    """
+    Test that increments are rejected with a 503 and Retry-After while the
+    publish cap is reached, without changing the count or publishing.
+    """
+    mocked_send_function = mocker.patch("endpoint.endpoint.send_to_exchange")
+    mocker.patch("endpoint.endpoint.settings.max_pending_publishes", 2)
+    mocker.patch("endpoint.endpoint.settings.publish_retry_after", 3)
+    endpoint.endpoint.pending_publishes = 2
+
+    response = client.post(path, json=body)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+    mocked_send_function.assert_not_called()
+    assert client.get("/api/count").json() == {"count": 0}
+    assert endpoint.endpoint.pending_publishes == 2
+
+
+def test_pending_publish_released(client, mocker):
+    """
+    Test that the pending publish slot is released after publishing, whether
+    the publish succeeds or fails.
+    """
+    mocked_send_function = mocker.patch("endpoint.endpoint.send_to_exchange")
+
+    client.post("/api/count/increment")
+    assert endpoint.endpoint.pending_publishes == 0
+
+    mocked_send_function.side_effect = ConnectionError("broker down")
+    with pytest.raises(ConnectionError):
+        client.post("/api/count/increment")
+    assert endpoint.endpoint.pending_publishes == 0
+
+
+def test_publish_status(client, mocker):
+    """Test GET /api/publish/status reports the saturation state."""
+    mocker.patch("endpoint.endpoint.settings.max_pending_publishes", 2)
+
+    endpoint.endpoint.pending_publishes = 1
+    response = client.get("/api/publish/status")
+    assert response.status_code == 200
+    assert response.json() == {"pending": 1, "limit": 2, "saturated": False}
+
+    endpoint.endpoint.pending_publishes = 2
+    response = client.get("/api/publish/status")
+    assert response.json() == {"pending": 2, "limit": 2, "saturated": True}
+
+
+def test_increment_propagates_trace_id(client, mocker):
+    """
+    Test that the X-Trace-Id request header is echoed back and is the current
+    trace id while the message is published.
+    """
+    seen_trace_ids = []
+    mocker.patch(
+        "endpoint.endpoint.send_to_exchange",
+        side_effect=lambda *args, **kwargs: seen_trace_ids.append(
+            get_trace_id()
+        ),
+    )
+
+    response = client.post(
+        "/api/count/increment", headers={"X-Trace-Id": "abc123"}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Trace-Id"] == "abc123"
+    assert seen_trace_ids == ["abc123"]
+
+
+@pytest.mark.parametrize(
+    "trace_id",
+    ["x" * 200, "abc 123", "abc123;drop", "g" * 32, "a" * 33],
+)
+def test_invalid_trace_id_replaced(client, trace_id):
+    """
+    Test that a trace id that is not a short hex string or UUID is replaced
+    with a new one.
+    """
+    response = client.get("/api/count", headers={"X-Trace-Id": trace_id})
+    assert response.status_code == 200
+    assert response.headers["X-Trace-Id"] != trace_id
+    assert len(response.headers["X-Trace-Id"]) == 32
+
+
+def test_uuid_trace_id_accepted(client):
+    """Test that a UUID trace id with dashes is reused."""
+    trace_id = "123e4567-e89b-12d3-a456-426614174000"
+    response = client.get("/api/count", headers={"X-Trace-Id": trace_id})
+    assert response.headers["X-Trace-Id"] == trace_id
+
+
+def test_trace_id_generated_when_missing(client):
+    """Test that a trace id is generated when the request has none."""
+    response = client.get("/api/count")
+    assert response.status_code == 200
+    assert response.headers["X-Trace-Id"]
+
+
+def test_admin_routes_disabled_by_default(client, mocker):
+    """Test that the admin routes are hidden unless enabled in the settings."""
+    mocker.patch("endpoint.endpoint.settings.enable_admin_routes", False)
+
+    assert client.get("/admin/loop").status_code == 404
+    assert client.post("/admin/profiler/start").status_code == 404
+    assert client.post("/admin/profiler/stop").status_code == 404
+
+
+def test_admin_profiler_start_and_stop(client, mocker, tmp_path):
+    """
+    Test that the profiler can be started and stopped through the admin
+    routes, and that stopping it writes a folded stack dump.
+    """
+    mocker.patch("endpoint.endpoint.settings.enable_admin_routes", True)
+    mocker.patch.object(endpoint.endpoint.profiler, "output_dir", tmp_path)
+
+    response = client.post("/admin/profiler/start")
+    assert response.status_code == 200
+    assert response.json() == {"path": None}
+
+    response = client.post("/admin/profiler/stop")
+    assert response.status_code == 200
+    path = response.json()["path"]
+    assert path is not None
+    assert path.startswith(str(tmp_path))
+    assert path.endswith(".folded")
+
+    # Stopping again does nothing.
+    response = client.post("/admin/profiler/stop")
+    assert response.json() == {"path": None}
+
+
+def test_admin_loop_stats(client, mocker):
+    """Test that the loop stats are reported when admin routes are enabled."""
+    mocker.patch("endpoint.endpoint.settings.enable_admin_routes", True)
+
+    response = client.get("/admin/loop")
+    assert response.status_code == 200
+    assert set(response.json()) == {"last_lag", "max_lag"}
+
+
+def test_lifespan_starts_off_the_main_thread():
+    """
+    Test that the app starts and serves requests when its loop runs off the
+    main thread, where the profiler signal cannot be installed.
+    """
+    endpoint.endpoint.num_calls = 0
+    with TestClient(app) as client:
+        response = client.get("/health")
+        assert response.status_code == 200
+
+
+def test_request_to_publish_latency(client, mocker):
+    """
+    Test that the time from receiving an increment to publishing it is
+    recorded, and served by the admin latency route.
+    """
+    mocker.patch("endpoint.endpoint.send_to_exchange")
+    mocker.patch("endpoint.endpoint.settings.enable_admin_routes", True)
+    mocker.patch(
+        "endpoint.endpoint.settings.rabbitmq_queue", MOCKED_RABBITMQ_QUEUE
+    )
+    latency_histograms.clear()
+
+    client.post("/api/count/increment")
+
+    response = client.get("/admin/latency")
+    assert response.status_code == 200
+    stages = response.json()[MOCKED_RABBITMQ_QUEUE]
+    assert stages["request_to_publish"]["count"] == 1
+    latency_histograms.clear()
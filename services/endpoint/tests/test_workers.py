@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from endpoint.workers import supervise_workers
+
+context = multiprocessing.get_context("spawn")
+
+
+@pytest.fixture(autouse=True)
+def restore_signal_handlers():
+    """Fixture to undo the signal handlers installed by the supervisor."""
+    handlers = {
+        sig: signal.getsignal(sig)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR2)
+    }
+    yield
+    for sig, handler in handlers.items():
+        signal.signal(sig, handler)
+
+
+def test_failed_worker_stops_the_others():
+    """
+    Test that a worker exiting on its own stops the other workers and makes
+    the parent report the worker's exit code.
+    """
+    sleeper = context.Process(target=time.sleep, args=(30,))
+    failing = context.Process(target=sys.exit, args=(1,))
+
+    start = time.monotonic()
+    status = supervise_workers([sleeper, failing])
+
+    assert status == 1
+    assert not sleeper.is_alive()
+    assert time.monotonic() - start < 20
+
+
+def test_worker_killed_by_signal():
+    """Test that a worker killed by a signal is reported as 128 + signal."""
+    status = supervise_workers([context.Process(target=os.abort)])
+    assert status == 128 + signal.SIGABRT
+
+
+def test_sigterm_stops_workers():
+    """Test that SIGTERM stops all workers and the parent reports success."""
+    workers = [
+        context.Process(target=time.sleep, args=(30,)) for _ in range(2)
+    ]
+    threading.Timer(1, os.kill, (os.getpid(), signal.SIGTERM)).start()
+
+    status = supervise_workers(workers)
+
+    assert status == 0
+    assert not any(worker.is_alive() for worker in workers)
@@ -1,5 +1,6 @@
 from pathlib import Path
 
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,5 +9,24 @@ class Settings(BaseSettings):
 
     rabbitmq_queue: str
 
+    # Where to store processed events. Nothing is stored if unset.
+    result_db_path: Path | None = None
+    result_batch_size: int = Field(default=500, ge=1)
+    result_flush_interval: float = Field(default=0.05, gt=0)
+
+    # How often to log the latency histograms, in seconds.
+    latency_log_interval: float = Field(default=60, gt=0)
+
+    # Which of the receiver instances this is, used to claim partitions when
+    # the queue is partitioned.
+    receiver_index: int = Field(default=0, ge=0)
+    receiver_count: int = Field(default=1, ge=1)
+
+    @model_validator(mode="after")
+    def check_receiver_index(self) -> "Settings":
+        if self.receiver_index >= self.receiver_count:
+            raise ValueError("receiver_index must be less than receiver_count")
+        return self
+
 
 settings = Settings(_env_file=Path(__file__).parents[1] / ".env")  # noqa
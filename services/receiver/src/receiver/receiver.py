@@ -1,16 +1,34 @@
 import asyncio
 import json
 import random
+import time
+from contextlib import nullcontext
 from logging import getLogger
 
 from aio_pika import IncomingMessage
 
+from commons.tracing import get_trace_id
+from receiver.sink import ProcessedEvent, ResultSink
+
 
 logger = getLogger(__name__)
+result_sink: ResultSink | None = None
+
+
+def use_result_sink(sink: ResultSink | None):
+    """Sets the sink processed events are written to. None stores nothing."""
+    global result_sink
+    result_sink = sink
 
 
 async def process_message(msg: IncomingMessage):
-    async with msg.process():
+    # Malformed messages are rejected when an exception leaves this block.
+    # Messages whose result could not be stored are requeued instead, and
+    # ignore_processed keeps the block from acking them afterwards.
+    in_flight = (
+        result_sink.in_flight() if result_sink is not None else nullcontext()
+    )
+    async with in_flight, msg.process(ignore_processed=True):
         # Decode the message and check if it has a JSON body with key "count"
         if msg.body:
             try:
@@ -35,3 +53,18 @@ async def process_message(msg: IncomingMessage):
         await asyncio.sleep(wait_for)
 
         logger.info(f"{wait_for=}, {count=}")
+
+        # Only ack the message once its result is committed.
+        if result_sink is not None:
+            try:
+                await result_sink.write(
+                    ProcessedEvent(
+                        trace_id=get_trace_id(),
+                        count=count,
+                        increment=message.get("increment", 1),
+                        processed_at=time.time(),
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Failed to store result, requeueing: {e}")
+                await msg.nack(requeue=True)
@@ -0,0 +1,169 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from logging import getLogger
+from pathlib import Path
+from typing import NamedTuple
+
+
+logger = getLogger(__name__)
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS processed_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trace_id TEXT,
+    count INTEGER NOT NULL,
+    increment INTEGER NOT NULL,
+    processed_at REAL NOT NULL
+)
+"""
+INSERT_EVENT = """
+INSERT INTO processed_events (trace_id, count, increment, processed_at)
+VALUES (?, ?, ?, ?)
+"""
+
+
+class ProcessedEvent(NamedTuple):
+    trace_id: str | None
+    count: int
+    increment: int
+    processed_at: float
+
+
+class ResultSink:
+    """Writes processed events to a local SQLite database in batches.
+
+    Events are buffered and committed together with `executemany` once
+    `batch_size` events are waiting or every `flush_interval` seconds. All
+    database work runs on a single background thread, off the event loop.
+
+    Handlers that wrap each message in `in_flight()` also get their batch
+    committed as soon as every message in flight is waiting on it, since no
+    other write could join the batch before `flush_interval` is up.
+
+    `write` only returns once the batch holding the event is committed, so a
+    message handler that awaits it before acking never acks a message whose
+    result could still be lost.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer: list[tuple[ProcessedEvent, asyncio.Future]] = []
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="result-sink"
+        )
+        self._connection: sqlite3.Connection | None = None
+        self._flusher: asyncio.Task | None = None
+        self._flushes: set[asyncio.Task] = set()
+        self._in_flight = 0
+        self._waiting = 0
+
+    async def start(self):
+        """Opens the database and starts flushing periodically."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._open)
+        self._flusher = loop.create_task(self._flush_periodically())
+        logger.info(f"Writing processed events to {self.path}")
+
+    async def close(self):
+        """Commits any buffered events and closes the database."""
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        self._flusher = None
+        await asyncio.gather(*self._flushes)
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+
+    async def write(self, event: ProcessedEvent):
+        """Buffers an event and waits until its batch is committed."""
+        if self._flusher is None:
+            raise RuntimeError("The result sink has not been started")
+
+        committed = asyncio.get_running_loop().create_future()
+        self._buffer.append((event, committed))
+        self._waiting += 1
+        try:
+            if len(self._buffer) >= self.batch_size or self._all_waiting():
+                self._schedule_flush()
+            await committed
+        finally:
+            self._waiting -= 1
+
+    @asynccontextmanager
+    async def in_flight(self):
+        """Counts a message as in flight while it is being handled."""
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            # The message may have finished without writing, leaving only
+            # messages that are waiting on the sink.
+            if self._buffer and self._all_waiting():
+                self._schedule_flush()
+
+    async def flush(self):
+        """Commits all buffered events in a single transaction."""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                self._executor, self._commit, [event for event, _ in batch]
+            )
+        except Exception as e:
+            logger.error(f"Failed to commit {len(batch)} events: {e}")
+            for _, committed in batch:
+                if not committed.done():
+                    committed.set_exception(e)
+            return
+
+        for _, committed in batch:
+            if not committed.done():
+                committed.set_result(None)
+
+    def _all_waiting(self) -> bool:
+        return 0 < self._in_flight <= self._waiting
+
+    def _schedule_flush(self):
+        # Flushes run as their own tasks so cancelling the periodic flusher
+        # never abandons a batch that is being committed.
+        flush = asyncio.create_task(self.flush())
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flushes.discard)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._buffer:
+                self._schedule_flush()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(CREATE_TABLE)
+        self._connection.commit()
+
+    def _commit(self, events: list[ProcessedEvent]):
+        with self._connection:
+            self._connection.executemany(INSERT_EVENT, events)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
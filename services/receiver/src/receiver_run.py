@@ -2,9 +2,13 @@ import asyncio
 import logging
 
 from receiver import process_message
+from receiver.receiver import use_result_sink
 from receiver.config import settings
-from commons.rabbitmq_utils import rabbitmq_consumer
+from receiver.sink import ResultSink
+from commons.profiling import install_profiler_signal, loop_monitor
+from commons.rabbitmq_utils import claim_partitions, rabbitmq_consumer
 from commons.logging.setup_logging import setup_logging
+from commons.tracing import log_latency_periodically
 
 
 setup_logging(service_name="receiver", log_level=logging.INFO)
@@ -17,6 +21,36 @@ def on_startup():
     logger.info(f"Loading with settings\n{settings.model_dump_json(indent=2)}")
 
 
+async def main():
+    # Claim partitions first so a bad partition setup fails at startup.
+    partitions = claim_partitions(
+        settings.receiver_index, settings.receiver_count
+    )
+    loop_monitor.start()
+    install_profiler_signal()
+    latency_logger = asyncio.create_task(
+        log_latency_periodically(settings.latency_log_interval)
+    )
+    result_sink = None
+    if settings.result_db_path is not None:
+        result_sink = ResultSink(
+            settings.result_db_path,
+            batch_size=settings.result_batch_size,
+            flush_interval=settings.result_flush_interval,
+        )
+        await result_sink.start()
+        use_result_sink(result_sink)
+
+    try:
+        await rabbitmq_consumer(
+            settings.rabbitmq_queue, process_message, partitions=partitions
+        )
+    finally:
+        latency_logger.cancel()
+        if result_sink is not None:
+            await result_sink.close()
+
+
 if __name__ == "__main__":
     on_startup()
-    asyncio.run(rabbitmq_consumer(settings.rabbitmq_queue, process_message))
+    asyncio.run(main())
@@ -4,6 +4,7 @@ from aio_pika import IncomingMessage
 
 # The function to test
 from receiver.receiver import process_message
+from receiver.sink import ProcessedEvent
 
 # Mark all tests in this file as asyncio
 pytestmark = pytest.mark.asyncio
@@ -136,3 +137,49 @@ async def test_process_message_invalid_json_string(
     mock_incoming_message.process.assert_called_once()
     mock_incoming_message.process.return_value.__aenter__.assert_called_once()
     mock_incoming_message.process.return_value.__aexit__.assert_called_once()
+
+
+async def test_process_message_writes_result(mock_incoming_message, mocker):
+    """
+    Test that the processed event is written to the result sink, inside the
+    message's process context so the message is only acked afterwards.
+    """
+    message_data = {"count": 10, "increment": 4}
+    mock_incoming_message.body = json.dumps(message_data).encode("utf-8")
+    mocker.patch("receiver.receiver.asyncio.sleep")
+    mocker.patch("receiver.receiver.get_trace_id", return_value="trace-1")
+    mocker.patch("receiver.receiver.time.time", return_value=123.0)
+    mock_sink = mocker.MagicMock()
+    mock_sink.write = mocker.AsyncMock()
+    mocker.patch("receiver.receiver.result_sink", mock_sink)
+
+    await process_message(mock_incoming_message)
+
+    mock_sink.write.assert_awaited_once_with(
+        ProcessedEvent(
+            trace_id="trace-1", count=10, increment=4, processed_at=123.0
+        )
+    )
+    mock_incoming_message.nack.assert_not_called()
+    mock_incoming_message.process.return_value.__aexit__.assert_called_once()
+
+
+async def test_process_message_requeues_when_result_not_stored(
+    mock_incoming_message, mocker
+):
+    """
+    Test that a message whose result cannot be committed is requeued rather
+    than rejected, so it is not lost.
+    """
+    mock_incoming_message.body = json.dumps({"count": 1}).encode("utf-8")
+    mocker.patch("receiver.receiver.asyncio.sleep")
+    mock_sink = mocker.MagicMock()
+    mock_sink.write = mocker.AsyncMock(side_effect=OSError("disk I/O error"))
+    mocker.patch("receiver.receiver.result_sink", mock_sink)
+
+    await process_message(mock_incoming_message)
+
+    mock_incoming_message.nack.assert_awaited_once_with(requeue=True)
+    mock_incoming_message.process.assert_called_once_with(
+        ignore_processed=True
+    )
@@ -0,0 +1,143 @@
+import asyncio
+import sqlite3
+
+import pytest
+import pytest_asyncio
+
+from receiver.sink import ProcessedEvent, ResultSink
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+def read_events(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute(
+            "SELECT trace_id, count, increment, processed_at "
+            "FROM processed_events ORDER BY id"
+        ).fetchall()
+
+
+@pytest_asyncio.fixture
+async def sink(tmp_path):
+    """Fixture for a started result sink with a long flush interval."""
+    result_sink = ResultSink(
+        tmp_path / "results.db", batch_size=3, flush_interval=60
+    )
+    await result_sink.start()
+    yield result_sink
+    await result_sink.close()
+
+
+async def test_write_waits_for_batch_commit(sink):
+    """
+    Test that writes only return once their batch is committed, and that a
+    full batch is committed without waiting for the flush interval.
+    """
+    events = [ProcessedEvent(f"trace-{i}", i, 1, 1.0) for i in range(3)]
+
+    first = asyncio.create_task(sink.write(events[0]))
+    await asyncio.sleep(0.01)
+    assert not first.done()
+    assert read_events(sink.path) == []
+
+    await asyncio.gather(first, sink.write(events[1]), sink.write(events[2]))
+
+    assert read_events(sink.path) == [tuple(event) for event in events]
+
+
+async def test_database_uses_wal_mode(sink):
+    """Test that the database is opened in WAL mode."""
+    with sqlite3.connect(sink.path) as connection:
+        (mode,) = connection.execute("PRAGMA journal_mode").fetchone()
+    assert mode == "wal"
+
+
+async def test_periodic_flush(tmp_path):
+    """Test that a partial batch is committed after the flush interval."""
+    result_sink = ResultSink(
+        tmp_path / "results.db", batch_size=100, flush_interval=0.01
+    )
+    await result_sink.start()
+
+    event = ProcessedEvent(None, 7, 5, 2.0)
+    await asyncio.wait_for(result_sink.write(event), timeout=1)
+    await result_sink.close()
+
+    assert read_events(result_sink.path) == [tuple(event)]
+
+
+async def test_close_commits_buffered_events(sink):
+    """Test that closing the sink commits events still in the buffer."""
+    write = asyncio.create_task(sink.write(ProcessedEvent(None, 1, 1, 1.0)))
+    await asyncio.sleep(0)
+
+    await sink.close()
+    await write
+
+    assert len(read_events(sink.path)) == 1
+
+
+async def test_failed_commit_fails_writes(sink, mocker):
+    """Test that every write of a batch fails when its commit fails."""
+    mocker.patch.object(
+        sink, "_commit", side_effect=sqlite3.OperationalError("disk I/O")
+    )
+
+    results = await asyncio.gather(
+        *(sink.write(ProcessedEvent(None, i, 1, 1.0)) for i in range(3)),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, sqlite3.OperationalError) for r in results)
+
+
+async def test_write_before_start(tmp_path):
+    """Test that writing to a sink that was not started fails."""
+    result_sink = ResultSink(tmp_path / "results.db")
+
+    with pytest.raises(RuntimeError, match="not been started"):
+        await result_sink.write(ProcessedEvent(None, 1, 1, 1.0))
+
+
+async def test_flush_when_all_in_flight_are_waiting(sink):
+    """
+    Test that a partial batch is committed without waiting for the flush
+    interval once every message in flight is waiting on it.
+    """
+
+    async def handle(event):
+        async with sink.in_flight():
+            await sink.write(event)
+
+    async with sink.in_flight():
+        first = asyncio.create_task(handle(ProcessedEvent(None, 1, 1, 1.0)))
+        await asyncio.sleep(0.01)
+        # The message held open here has not written yet.
+        assert not first.done()
+
+        await asyncio.wait_for(
+            sink.write(ProcessedEvent(None, 2, 1, 1.0)), timeout=1
+        )
+    await asyncio.wait_for(first, timeout=1)
+
+    assert len(read_events(sink.path)) == 2
+
+
+async def test_flush_when_in_flight_finishes_without_writing(sink):
+    """
+    Test that the waiting writes are committed when the only message not
+    waiting on the sink finishes without writing.
+    """
+
+    async def handle(event):
+        async with sink.in_flight():
+            await sink.write(event)
+
+    async with sink.in_flight():
+        write = asyncio.create_task(handle(ProcessedEvent(None, 1, 1, 1.0)))
+        await asyncio.sleep(0.01)
+        assert not write.done()
+
+    await asyncio.wait_for(write, timeout=1)
+    assert len(read_events(sink.path)) == 1
@@ -7,6 +7,8 @@ from google.auth.exceptions import DefaultCredentialsError
 from google.cloud.logging_v2.handlers import CloudLoggingHandler
 from google.cloud.logging_v2.resource import Resource
 
+from commons.tracing import TraceIdFilter
+
 
 def setup_logging(service_name: str, log_level: int):
     """
@@ -82,10 +84,18 @@ def setup_logging(service_name: str, log_level: int):
 
     console_handler = logging.StreamHandler(sys.stdout)
     formatter = logging.Formatter(
-        "%(asctime)s -%(name)s:%(lineno)d - %(levelname)s - %(message)s"
+        "%(asctime)s -%(name)s:%(lineno)d - %(levelname)s - "
+        "[%(trace_id)s] %(message)s"
     )
     console_handler.setFormatter(formatter)
 
+    # Attach the trace id of the current message or request to all records.
+    # The Cloud Logging handler turns `record.labels` into the entry's labels
+    # in a filter of its own, so ours has to run before that one.
+    trace_id_filter = TraceIdFilter()
+    gcp_handler.filters.insert(0, trace_id_filter)
+    console_handler.addFilter(trace_id_filter)
+
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
     root_logger.handlers.clear()
@@ -0,0 +1,16 @@
+from .profiling import (
+    EventLoopMonitor,
+    SamplingProfiler,
+    install_profiler_signal,
+    loop_monitor,
+    profiler,
+)
+
+
+__all__ = [
+    "EventLoopMonitor",
+    "SamplingProfiler",
+    "install_profiler_signal",
+    "loop_monitor",
+    "profiler",
+]
@@ -0,0 +1,226 @@
+import asyncio
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+from logging import getLogger
+from pathlib import Path
+from types import FrameType
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(extra="ignore")
+
+    loop_lag_interval: float = 0.25
+    loop_lag_threshold: float = 0.1
+
+    profiler_interval: float = 0.005
+    profiler_output_dir: Path = Path("/tmp/profiles")
+
+
+settings = Settings(_env_file=Path(__file__).parent / ".env")  # noqa
+logger = getLogger("commons.profiling")
+
+
+def _format_stack(frame: FrameType) -> str:
+    """Formats a frame and its callers as a folded flamegraph stack."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class EventLoopMonitor:
+    """Measures event loop lag and logs where the loop is blocked.
+
+    A task on the loop sleeps for `interval` and records how late it wakes up.
+    A watchdog thread checks that the task keeps waking up, and if the loop is
+    stuck for longer than `threshold` it logs the stack of the loop thread,
+    which is where the blocking call is.
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.loop_lag_interval,
+        threshold: float = settings.loop_lag_threshold,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Starts monitoring the running event loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="event-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self):
+        """Stops monitoring."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _measure(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+
+            lag = max(0.0, now - start - self.interval)
+            self._heartbeat = now
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+
+            if lag > self.threshold:
+                logger.warning(f"Event loop lagged by {lag:.3f}s")
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled <= self.threshold or reported == heartbeat:
+                continue
+
+            # Only report each stall once, while the loop is still stuck.
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                f"Event loop blocked for at least {stalled:.3f}s in:\n{stack}"
+            )
+
+    def stats(self) -> dict[str, float]:
+        """Gets the last and maximum measured lag in seconds."""
+        return {"last_lag": self.last_lag, "max_lag": self.max_lag}
+
+
+class SamplingProfiler:
+    """Samples the stack of a thread and writes it as folded stacks.
+
+    The output has one `frame;frame;frame count` line per distinct stack, which
+    can be turned into a flamegraph with `flamegraph.pl` or speedscope.
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.profiler_interval,
+        output_dir: Path = settings.profiler_output_dir,
+    ):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.samples: Counter[str] = Counter()
+
+        self._thread_id: int | None = None
+        self._sampler: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._stop_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None and self._sampler.is_alive()
+
+    def start(self, thread_id: int | None = None):
+        """Starts sampling a thread.
+
+        Args:
+            thread_id: The id of the thread to sample. Defaults to the calling
+                thread, which is the event loop thread when called from a
+                coroutine or signal handler.
+        """
+        if self.running:
+            return
+        self._thread_id = thread_id or threading.get_ident()
+        self.samples.clear()
+        self._stop.clear()
+        self._sampler = threading.Thread(
+            target=self._sample, name="sampling-profiler", daemon=True
+        )
+        self._sampler.start()
+        logger.info(f"Sampling profiler started every {self.interval}s")
+
+    def stop(self) -> Path | None:
+        """Stops sampling and writes the folded stacks.
+
+        Returns:
+            The path of the written dump, or None if the profiler was not
+            running.
+        """
+        with self._stop_lock:
+            if not self.running:
+                return None
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+            return self.dump()
+
+    def dump(self) -> Path:
+        """Writes the collected samples as folded stacks."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = self.output_dir / f"profile-{timestamp}.folded"
+        with path.open("w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(
+            f"Wrote {sum(self.samples.values())} profiler samples to {path}"
+        )
+        return path
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.samples[_format_stack(frame)] += 1
+
+
+loop_monitor = EventLoopMonitor()
+profiler = SamplingProfiler()
+
+
+def install_profiler_signal(sig: signal.Signals = signal.SIGUSR2):
+    """Toggles the profiler whenever the process receives `sig`.
+
+    Must be called from within the running event loop so the loop thread is
+    the one being sampled. Signal handlers can only be installed from the
+    main thread, so elsewhere (e.g. under a test client) this only warns.
+    """
+    loop = asyncio.get_running_loop()
+    if threading.current_thread() is not threading.main_thread():
+        logger.warning(
+            f"Not on the main thread, so {sig.name} will not toggle the "
+            f"sampling profiler"
+        )
+        return
+
+    def toggle():
+        # Stopping joins the sampler and writes the dump, so keep that off
+        # the event loop.
+        if profiler.running:
+            loop.run_in_executor(None, profiler.stop)
+        else:
+            profiler.start()
+
+    loop.add_signal_handler(sig, toggle)
+    logger.debug(f"Send {sig.name} to toggle the sampling profiler")
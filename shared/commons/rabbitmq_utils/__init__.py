@@ -1,7 +1,14 @@
-from .rabbitmq_utils import send_to_exchange, rabbitmq_consumer
+from .rabbitmq_utils import (
+    claim_partitions,
+    rabbitmq_consumer,
+    send_to_exchange,
+    traced_handler,
+)
 
 
 __all__ = [
-    "send_to_exchange",
+    "claim_partitions",
     "rabbitmq_consumer",
+    "send_to_exchange",
+    "traced_handler",
 ]
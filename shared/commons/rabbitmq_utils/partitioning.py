@@ -0,0 +1,49 @@
+import hashlib
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    """Maps a 64-bit key to one of `num_buckets` buckets.
+
+    This is the jump consistent hash of Lamping and Veach. When the number of
+    buckets grows from n to n + 1, only 1 / (n + 1) of the keys move.
+    """
+    bucket, j = -1, 0
+    while j < num_buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def partition_for(partition_key: str | bytes, num_partitions: int) -> int:
+    """Gets the partition a key belongs to.
+
+    Args:
+        partition_key: The key whose messages must stay in order.
+        num_partitions: The total number of partitions.
+    """
+    if isinstance(partition_key, str):
+        partition_key = partition_key.encode("utf-8")
+    digest = hashlib.blake2b(partition_key, digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "big"), num_partitions)
+
+
+def partition_queue(rabbitmq_queue: str, partition: int) -> str:
+    """Gets the name of the queue, and routing key, of a partition."""
+    return f"{rabbitmq_queue}.{partition}"
+
+
+def claim_partitions(index: int, count: int, num_partitions: int) -> list[int]:
+    """Gets the partitions a consumer instance is responsible for.
+
+    Partitions are dealt out round-robin, so every partition is claimed by
+    exactly one of `count` instances.
+
+    Args:
+        index: The index of this instance, from 0 to `count - 1`.
+        count: The total number of consumer instances.
+        num_partitions: The total number of partitions.
+    """
+    if not 0 <= index < count:
+        raise ValueError(f"Instance index {index} is not in [0, {count})")
+    return list(range(index, num_partitions, count))
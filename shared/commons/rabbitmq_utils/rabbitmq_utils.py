@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import time
 from logging import getLogger
 from pathlib import Path
 from typing import Awaitable, Callable
@@ -7,6 +8,7 @@ from typing import Awaitable, Callable
 import aio_pika
 from aio_pika import ExchangeType, DeliveryMode, Message, IncomingMessage
 from aio_pika.exceptions import ChannelClosed
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from tenacity import (
     retry,
@@ -15,6 +17,21 @@ from tenacity import (
     after_log,
 )
 
+from commons.tracing import (
+    TRACE_ID_HEADER,
+    api_seconds,
+    make_trace_headers,
+    new_trace_id,
+    observe_latency,
+    queue_wait_seconds,
+    trace_id_var,
+)
+from .partitioning import (
+    claim_partitions as _claim_partitions,
+    partition_for,
+    partition_queue,
+)
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(extra="ignore")
@@ -24,6 +41,13 @@ class Settings(BaseSettings):
     rabbitmq_host: str
     rabbitmq_exchange: str
 
+    # Number of partition queues each queue is split into. 0 disables
+    # partitioning. Publishers and consumers must agree on this.
+    rabbitmq_partitions: int = Field(default=0, ge=0)
+    # How many unacked messages each partition may have in flight. Above 1,
+    # messages of the same partition may be handled out of order.
+    rabbitmq_partition_prefetch: int = Field(default=1, ge=1)
+
 
 settings = Settings(_env_file=Path(__file__).parent / ".env")  # noqa
 logger = getLogger("commons.rabbitmq_utils")
@@ -43,14 +67,60 @@ async def make_connection():
     return await aio_pika.connect(connection_url)
 
 
-async def send_to_exchange(message_body: bytes | str, routing_key: str):
+def claim_partitions(index: int, count: int) -> list[int] | None:
+    """Gets the partitions a consumer instance should consume.
+
+    Returns None if partitioning is disabled, in which case the instance
+    consumes the unpartitioned queue.
+
+    Args:
+        index: The index of this instance, from 0 to `count - 1`.
+        count: The total number of consumer instances.
+
+    Raises:
+        ValueError: If there are more instances than partitions, since some
+            instances would then claim nothing and sit idle.
+    """
+    if not settings.rabbitmq_partitions:
+        return None
+    if count > settings.rabbitmq_partitions:
+        raise ValueError(
+            f"{count} consumer instances cannot share "
+            f"{settings.rabbitmq_partitions} partitions, since some would "
+            f"consume nothing. Raise RABBITMQ_PARTITIONS to at least {count}."
+        )
+    return _claim_partitions(index, count, settings.rabbitmq_partitions)
+
+
+async def send_to_exchange(
+    message_body: bytes | str,
+    routing_key: str,
+    partition_key: str | bytes | None = None,
+):
     """Sends a message to the exchange.
 
+    The message is stamped with a trace id and its publish timestamp in the
+    headers so consumers can measure how long it waited in the queue.
+
+    If partitioning is enabled, the message is routed to the partition queue
+    that `partition_key` hashes to, so messages with the same key stay in
+    order. Messages without a key all go to partition 0, so they stay in
+    order too.
+
     Args:
         message_body: The message body to send.
         routing_key: The routing key for the message. This is the name of the
             queue in our case.
+        partition_key: The key whose messages must stay in order.
     """
+    if settings.rabbitmq_partitions:
+        partition = (
+            partition_for(partition_key, settings.rabbitmq_partitions)
+            if partition_key is not None
+            else 0
+        )
+        routing_key = partition_queue(routing_key, partition)
+
     connection = await make_connection()
 
     async with connection:
@@ -71,7 +141,13 @@ async def send_to_exchange(message_body: bytes | str, routing_key: str):
         # Convert to bytes if necessary
         if isinstance(message_body, str):
             message_body = message_body.encode("utf-8")
-        message = Message(message_body, delivery_mode=DeliveryMode.PERSISTENT)
+        # The headers are made last so the publish timestamp excludes the
+        # time spent connecting, which is not time spent in the queue.
+        message = Message(
+            message_body,
+            delivery_mode=DeliveryMode.PERSISTENT,
+            headers=make_trace_headers(),
+        )
 
         await exchange.publish(message, routing_key=routing_key)
         logger.debug(
@@ -80,35 +156,131 @@ async def send_to_exchange(message_body: bytes | str, routing_key: str):
         )
 
 
+def traced_handler(
+    rabbitmq_queue: str,
+    on_message: Callable[[IncomingMessage], Awaitable[None]],
+) -> Callable[[IncomingMessage], Awaitable[None]]:
+    """Wraps a message handler to record its latency and propagate trace ids.
+
+    The API, queue wait and handler times are recorded per queue in the latency
+    histograms of `commons.tracing`, and the trace id of the message is set
+    for the duration of the handler so it shows up in log records.
+
+    Args:
+        rabbitmq_queue: The name of the queue the handler consumes from.
+        on_message: The handler to wrap.
+    """
+
+    async def wrapper(msg: IncomingMessage):
+        headers = msg.headers or {}
+        token = trace_id_var.set(
+            str(headers.get(TRACE_ID_HEADER) or new_trace_id())
+        )
+        try:
+            api_time = api_seconds(headers)
+            if api_time is not None:
+                observe_latency(rabbitmq_queue, "api", api_time)
+
+            queue_wait = queue_wait_seconds(headers)
+            if queue_wait is not None:
+                observe_latency(rabbitmq_queue, "queue_wait", queue_wait)
+
+            start = time.perf_counter()
+            try:
+                await on_message(msg)
+            finally:
+                handler_time = time.perf_counter() - start
+                observe_latency(rabbitmq_queue, "handler", handler_time)
+                logger.debug(
+                    f"Handled message from '{rabbitmq_queue}' with "
+                    f"{api_time=}, {queue_wait=}, {handler_time=}"
+                )
+        finally:
+            trace_id_var.reset(token)
+
+    return wrapper
+
+
+async def consume_queue(
+    connection: aio_pika.abc.AbstractConnection,
+    rabbitmq_queue: str,
+    on_message: Callable[[IncomingMessage], Awaitable[None]],
+    ordered: bool = False,
+):
+    """Declares a queue, binds it to the exchange and starts consuming it.
+
+    Args:
+        connection: The connection to open the channel on.
+        rabbitmq_queue: The name of the queue, which is also its routing key.
+        on_message: The handler for each message.
+        ordered: Let only one consumer consume the queue and limit the
+            messages in flight to `rabbitmq_partition_prefetch`, which keeps
+            messages in order when it is 1.
+    """
+    channel = await connection.channel()
+    if ordered:
+        await channel.set_qos(
+            prefetch_count=settings.rabbitmq_partition_prefetch
+        )
+
+    try:
+        rmq_exchange = await channel.declare_exchange(
+            settings.rabbitmq_exchange, ExchangeType.DIRECT, durable=True
+        )
+    except ChannelClosed as e:
+        logger.error(
+            f"Failed to declare exchange {settings.rabbitmq_exchange}: {e}"
+        )
+        raise e
+
+    arguments = {"x-single-active-consumer": True} if ordered else None
+    try:
+        queue = await channel.declare_queue(
+            rabbitmq_queue, durable=True, arguments=arguments
+        )
+    except ChannelClosed as e:
+        logger.error(f"Failed to declare queue {rabbitmq_queue}: {e}")
+        raise e
+
+    await queue.bind(rmq_exchange)
+
+    await queue.consume(traced_handler(rabbitmq_queue, on_message))
+
+
 async def rabbitmq_consumer(
     rabbitmq_queue: str,
     on_message: Callable[[IncomingMessage], Awaitable[None]],
+    partitions: list[int] | None = None,
 ):
+    """Consumes a queue, or some of its partitions, indefinitely.
+
+    Each partition gets its own channel and, by default, is handled one
+    message at a time, so messages with the same partition key are handled in
+    order.
+
+    Args:
+        rabbitmq_queue: The name of the queue to consume.
+        on_message: The handler for each message.
+        partitions: The partitions of the queue to consume, as given by
+            `claim_partitions`. If None, the unpartitioned queue is consumed.
+    """
     connection = await make_connection()
 
     async with connection:
-        channel = await connection.channel()
-
-        try:
-            rmq_exchange = await channel.declare_exchange(
-                settings.rabbitmq_exchange, ExchangeType.DIRECT, durable=True
-            )
-        except ChannelClosed as e:
-            logger.error(
-                f"Failed to declare exchange "
-                f"{settings.rabbitmq_exchange}: {e}"
+        if partitions is None:
+            await consume_queue(connection, rabbitmq_queue, on_message)
+        else:
+            for partition in partitions:
+                await consume_queue(
+                    connection,
+                    partition_queue(rabbitmq_queue, partition),
+                    on_message,
+                    ordered=True,
+                )
+            logger.info(
+                f"Consuming partitions {partitions} of '{rabbitmq_queue}'"
             )
-            raise e
-
-        try:
-            queue = await channel.declare_queue(rabbitmq_queue, durable=True)
-        except ChannelClosed as e:
-            logger.error(f"Failed to declare queue {rabbitmq_queue}: {e}")
-            raise e
-
-        await queue.bind(rmq_exchange)
 
-        await queue.consume(on_message)
         logger.debug("Waiting for messages. To exit, press CTRL+C")
 
         # Keep the consumer running indefinitely.
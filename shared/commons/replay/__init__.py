@@ -0,0 +1,16 @@
+from .replay import (
+    ReplayMessage,
+    ReplayReport,
+    capture,
+    read_messages,
+    replay,
+)
+
+
+__all__ = [
+    "ReplayMessage",
+    "ReplayReport",
+    "capture",
+    "read_messages",
+    "replay",
+]
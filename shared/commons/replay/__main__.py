@@ -0,0 +1,87 @@
+"""Captures messages from the exchange and replays them offline.
+
+Usage:
+    python -m commons.replay capture counts.jsonl --routing-key counts
+    python -m commons.replay replay counts.jsonl \
+        --handler receiver:process_message --speed 2 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+from pathlib import Path
+
+from .replay import capture, read_messages, replay
+
+
+def load_handler(spec: str):
+    """Loads a handler given as `module:attribute`."""
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Handler '{spec}' is not of the form module:attr")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def positive_float(value: str) -> float:
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m commons.replay")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = subparsers.add_parser(
+        "capture", help="Capture messages from the exchange to a file."
+    )
+    capture_parser.add_argument("path", type=Path)
+    capture_parser.add_argument(
+        "--routing-key", action="append", required=True, dest="routing_keys"
+    )
+    capture_parser.add_argument("--limit", type=positive_int, default=None)
+
+    replay_parser = subparsers.add_parser(
+        "replay", help="Replay captured messages through a handler."
+    )
+    replay_parser.add_argument("path", type=Path)
+    replay_parser.add_argument(
+        "--handler", required=True, help="The handler as module:attr."
+    )
+    replay_parser.add_argument(
+        "--speed",
+        type=positive_float,
+        default=None,
+        help="Multiple of the captured rate. As fast as possible if unset.",
+    )
+    replay_parser.add_argument("--concurrency", type=positive_int, default=1)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "capture":
+        asyncio.run(capture(args.path, args.routing_keys, args.limit))
+    else:
+        report = asyncio.run(
+            replay(
+                read_messages(args.path),
+                load_handler(args.handler),
+                speed=args.speed,
+                concurrency=args.concurrency,
+            )
+        )
+        print(json.dumps(report.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
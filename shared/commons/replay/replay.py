@@ -0,0 +1,246 @@
+import asyncio
+import base64
+import json
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator
+
+from commons.tracing import PUBLISHED_AT_HEADER, header_ns
+
+
+logger = getLogger("commons.replay")
+
+
+@dataclass
+class ReplayMessage:
+    """A captured message that quacks like an `aio_pika.IncomingMessage`.
+
+    Only the parts handlers use are provided: the body, the headers, the
+    routing key and a `process()` context manager, which does nothing since
+    there is no broker to ack to.
+    """
+
+    body: bytes
+    headers: dict
+    routing_key: str
+    timestamp_ns: int
+
+    @asynccontextmanager
+    async def process(self, *args, **kwargs):
+        yield
+
+    def to_record(self) -> dict:
+        """Gets the message as a JSON serializable record.
+
+        Bytes header values are stored as base64 under `headers_b64`, like
+        bodies that are not UTF-8, so they are replayed as bytes.
+        """
+        headers = {}
+        headers_b64 = {}
+        for name, value in self.headers.items():
+            if isinstance(value, bytes):
+                headers_b64[name] = base64.b64encode(value).decode("ascii")
+            else:
+                headers[name] = value
+        record = {
+            "t": self.timestamp_ns,
+            "routing_key": self.routing_key,
+            "headers": headers,
+        }
+        if headers_b64:
+            record["headers_b64"] = headers_b64
+        try:
+            record["body"] = self.body.decode("utf-8")
+        except UnicodeDecodeError:
+            record["body_b64"] = base64.b64encode(self.body).decode("ascii")
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict) -> "ReplayMessage":
+        """Makes a message from a record written by `to_record`."""
+        if "body_b64" in record:
+            body = base64.b64decode(record["body_b64"])
+        else:
+            body = record["body"].encode("utf-8")
+        headers = dict(record.get("headers") or {})
+        for name, value in (record.get("headers_b64") or {}).items():
+            headers[name] = base64.b64decode(value)
+        return cls(
+            body=body,
+            headers=headers,
+            routing_key=record.get("routing_key", ""),
+            timestamp_ns=record["t"],
+        )
+
+
+def read_messages(path: Path) -> Iterator[ReplayMessage]:
+    """Reads the messages of a capture file, one JSON record per line."""
+    with path.open() as f:
+        for line in f:
+            if line.strip():
+                yield ReplayMessage.from_record(json.loads(line))
+
+
+async def capture(path: Path, routing_keys: list[str], limit: int | None):
+    """Captures messages published to the exchange into a JSONL file.
+
+    A temporary exclusive queue is bound to the exchange with each routing
+    key, so the messages are copied without taking them from the real
+    consumers.
+
+    Args:
+        path: The file to append the captured messages to.
+        routing_keys: The routing keys to capture, e.g. the queue name, or
+            the partition queue names if the queue is partitioned.
+        limit: Stop after this many messages. Captures forever if None.
+    """
+    # Imported here so replaying does not need the broker to be configured.
+    from aio_pika import ExchangeType
+    from commons.rabbitmq_utils.rabbitmq_utils import (
+        make_connection,
+        settings,
+    )
+
+    connection = await make_connection()
+    captured = 0
+
+    async with connection:
+        channel = await connection.channel()
+        exchange = await channel.declare_exchange(
+            settings.rabbitmq_exchange, ExchangeType.DIRECT, durable=True
+        )
+        queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        for routing_key in routing_keys:
+            await queue.bind(exchange, routing_key=routing_key)
+        logger.info(f"Capturing {routing_keys} to {path}")
+
+        with path.open("a") as f:
+            async with queue.iterator(no_ack=True) as messages:
+                async for msg in messages:
+                    headers = dict(msg.headers or {})
+                    published_at = header_ns(headers, PUBLISHED_AT_HEADER)
+                    if published_at is None:
+                        published_at = time.time_ns()
+                    message = ReplayMessage(
+                        body=msg.body,
+                        headers=headers,
+                        routing_key=msg.routing_key or "",
+                        timestamp_ns=published_at,
+                    )
+                    record = json.dumps(message.to_record(), default=str)
+                    f.write(record + "\n")
+
+                    captured += 1
+                    if limit is not None and captured >= limit:
+                        break
+
+    logger.info(f"Captured {captured} messages to {path}")
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Gets the nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@dataclass
+class ReplayReport:
+    messages: int
+    errors: int
+    duration: float
+    latencies: list[float]
+
+    @property
+    def throughput(self) -> float:
+        """Gets the number of messages handled per second."""
+        return self.messages / self.duration if self.duration else 0.0
+
+    def summary(self) -> dict[str, float]:
+        """Gets the throughput and the latency distribution in seconds."""
+        latencies = sorted(self.latencies)
+        return {
+            "messages": self.messages,
+            "errors": self.errors,
+            "duration": self.duration,
+            "throughput": self.throughput,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p90": percentile(latencies, 90),
+            "latency_p99": percentile(latencies, 99),
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+async def replay(
+    messages: Iterator[ReplayMessage],
+    on_message: Callable[[ReplayMessage], Awaitable[None]],
+    speed: float | None = None,
+    concurrency: int = 1,
+) -> ReplayReport:
+    """Replays captured messages through a message handler.
+
+    Args:
+        messages: The messages to replay, in capture order.
+        on_message: The handler to replay the messages through, e.g.
+            `receiver.process_message`.
+        speed: Replay at this multiple of the captured rate, e.g. 2 for twice
+            as fast. If None, messages are replayed as fast as possible.
+        concurrency: How many messages may be handled at the same time, like
+            the prefetch count of a consumer.
+    """
+    if speed is not None and speed <= 0:
+        raise ValueError(f"speed must be positive, got {speed}")
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    tasks = set()
+
+    async def handle(message: ReplayMessage, scheduled: float):
+        nonlocal errors
+        try:
+            await on_message(message)
+        except Exception as e:
+            errors += 1
+            logger.warning(f"Handler failed on {message.body!r}: {e!r}")
+        finally:
+            latencies.append(time.perf_counter() - scheduled)
+            semaphore.release()
+
+    # Latencies are measured from when each message was due, not from when
+    # the handler got to it. Otherwise time spent waiting for a free slot is
+    # left out whenever the handler falls behind the replay rate.
+    start = time.perf_counter()
+    first_timestamp_ns = None
+    for message in messages:
+        scheduled = time.perf_counter()
+        if speed is not None:
+            if first_timestamp_ns is None:
+                first_timestamp_ns = message.timestamp_ns
+            due = (message.timestamp_ns - first_timestamp_ns) / 1e9 / speed
+            scheduled = start + due
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        await semaphore.acquire()
+        task = asyncio.create_task(handle(message, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks)
+    duration = time.perf_counter() - start
+
+    return ReplayReport(
+        messages=len(latencies),
+        errors=errors,
+        duration=duration,
+        latencies=latencies,
+    )
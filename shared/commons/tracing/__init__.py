@@ -0,0 +1,40 @@
+from .tracing import (
+    TRACE_ID_HEADER,
+    PUBLISHED_AT_HEADER,
+    RECEIVED_AT_HEADER,
+    Histogram,
+    TraceIdFilter,
+    api_seconds,
+    get_trace_id,
+    header_ns,
+    is_valid_trace_id,
+    latency_snapshot,
+    log_latency_periodically,
+    make_trace_headers,
+    new_trace_id,
+    observe_latency,
+    queue_wait_seconds,
+    received_at_var,
+    trace_id_var,
+)
+
+
+__all__ = [
+    "TRACE_ID_HEADER",
+    "PUBLISHED_AT_HEADER",
+    "RECEIVED_AT_HEADER",
+    "Histogram",
+    "TraceIdFilter",
+    "api_seconds",
+    "get_trace_id",
+    "header_ns",
+    "is_valid_trace_id",
+    "latency_snapshot",
+    "log_latency_periodically",
+    "make_trace_headers",
+    "new_trace_id",
+    "observe_latency",
+    "queue_wait_seconds",
+    "received_at_var",
+    "trace_id_var",
+]
@@ -0,0 +1,218 @@
+import asyncio
+import bisect
+import logging
+import re
+import time
+import uuid
+from contextvars import ContextVar
+
+
+TRACE_ID_HEADER = "x-trace-id"
+PUBLISHED_AT_HEADER = "x-published-at-ns"
+RECEIVED_AT_HEADER = "x-received-at-ns"
+
+logger = logging.getLogger("commons.tracing")
+
+# Upper bounds of the histogram buckets in seconds. Anything slower than the
+# last bound ends up in the overflow bucket.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Trace ids taken from clients must be short hex strings or UUIDs, since they
+# end up in every log line and in message headers.
+TRACE_ID_PATTERN = re.compile(
+    r"[0-9a-fA-F]{1,32}|[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}"
+)
+
+trace_id_var: ContextVar[str | None] = ContextVar("trace_id", default=None)
+# When the request that led to the current message was received, in ns.
+received_at_var: ContextVar[int | None] = ContextVar(
+    "received_at", default=None
+)
+
+
+def new_trace_id() -> str:
+    """Creates a new random trace id."""
+    return uuid.uuid4().hex
+
+
+def is_valid_trace_id(trace_id: str) -> bool:
+    """Checks that a trace id is a short hex string or a UUID."""
+    return TRACE_ID_PATTERN.fullmatch(trace_id) is not None
+
+
+def get_trace_id() -> str | None:
+    """Gets the trace id of the current context, if there is one."""
+    return trace_id_var.get()
+
+
+class TraceIdFilter(logging.Filter):
+    """Attaches the current trace id to every log record.
+
+    Records logged outside a traced context get a `-` so formatters can always
+    reference `%(trace_id)s`. Traced records also get a `trace_id` label,
+    which is where Cloud Logging reads per-record labels from.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = trace_id_var.get()
+        record.trace_id = trace_id or "-"
+        if trace_id is not None:
+            labels = getattr(record, "labels", None) or {}
+            record.labels = {**labels, "trace_id": trace_id}
+        return True
+
+
+class Histogram:
+    """A minimal fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Records a single observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Gets the upper bound of the bucket holding the `q` quantile.
+
+        Returns infinity if the quantile falls in the overflow bucket and 0 if
+        nothing was observed.
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            running += bucket_count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        """Gets the cumulative bucket counts, total count and sum."""
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = self.count
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+# Histograms keyed by queue name and then by stage, e.g.
+# `latency_histograms["counts"]["queue_wait"]`.
+latency_histograms: dict[str, dict[str, Histogram]] = {}
+
+
+def observe_latency(queue: str, stage: str, seconds: float):
+    """Records a latency observation for a stage of a queue's pipeline.
+
+    Args:
+        queue: The name of the queue the message was consumed from.
+        stage: The pipeline stage, e.g. `queue_wait` or `handler`.
+        seconds: The duration of the stage in seconds.
+    """
+    histograms = latency_histograms.setdefault(queue, {})
+    if stage not in histograms:
+        histograms[stage] = Histogram()
+    histograms[stage].observe(seconds)
+
+
+def latency_snapshot() -> dict[str, dict[str, dict]]:
+    """Gets a snapshot of all latency histograms."""
+    return {
+        queue: {stage: hist.snapshot() for stage, hist in stages.items()}
+        for queue, stages in latency_histograms.items()
+    }
+
+
+async def log_latency_periodically(interval: float):
+    """Logs a summary of all latency histograms every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        for queue, stages in latency_histograms.items():
+            for stage, hist in stages.items():
+                if not hist.count:
+                    continue
+                logger.info(
+                    f"Latency of '{queue}' {stage}: count={hist.count}, "
+                    f"mean={hist.sum / hist.count:.4f}s, "
+                    f"p50<={hist.quantile(0.5)}s, "
+                    f"p99<={hist.quantile(0.99)}s"
+                )
+
+
+def make_trace_headers() -> dict[str, str | int]:
+    """Makes message headers carrying a trace id and a publish timestamp.
+
+    The trace id of the current context is reused if there is one, so a
+    request that is already traced keeps its id across the broker. If the
+    request's receive time is known it is added too, so consumers can tell
+    how long the API took before publishing.
+    """
+    headers = {
+        TRACE_ID_HEADER: get_trace_id() or new_trace_id(),
+        PUBLISHED_AT_HEADER: time.time_ns(),
+    }
+    received_at = received_at_var.get()
+    if received_at is not None:
+        headers[RECEIVED_AT_HEADER] = received_at
+    return headers
+
+
+def header_ns(headers: dict | None, name: str) -> int | None:
+    """Gets a nanosecond timestamp header, or None if it is missing.
+
+    Headers that are not integers are treated as missing, so a malformed
+    message is still handled, just without its latency being measured.
+    """
+    if not headers or name not in headers:
+        return None
+    try:
+        return int(headers[name])
+    except (TypeError, ValueError):
+        logger.debug(f"Ignoring malformed {name} header {headers[name]!r}")
+        return None
+
+
+def queue_wait_seconds(headers: dict | None) -> float | None:
+    """Gets how long a message waited since it was published.
+
+    Returns None if the message has no valid publish timestamp. Clock skew
+    between publisher and consumer can make the wait negative, so it is
+    clamped to 0.
+    """
+    published_at = header_ns(headers, PUBLISHED_AT_HEADER)
+    if published_at is None:
+        return None
+    return max(0.0, (time.time_ns() - published_at) / 1e9)
+
+
+def api_seconds(headers: dict | None) -> float | None:
+    """Gets how long the API took from receiving the request to publishing.
+
+    Returns None if the message has no valid receive or publish timestamp.
+    """
+    received_at = header_ns(headers, RECEIVED_AT_HEADER)
+    published_at = header_ns(headers, PUBLISHED_AT_HEADER)
+    if received_at is None or published_at is None:
+        return None
+    return max(0.0, (published_at - received_at) / 1e9)
@@ -0,0 +1,6 @@
+import os
+
+# commons.rabbitmq_utils reads its settings when it is imported, so give it a
+# broker to (never) connect to before any test module imports it.
+os.environ.setdefault("RABBITMQ_HOST", "localhost")
+os.environ.setdefault("RABBITMQ_EXCHANGE", "test_exchange")
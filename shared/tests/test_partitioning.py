@@ -0,0 +1,75 @@
+import pytest
+
+from commons.rabbitmq_utils.partitioning import (
+    claim_partitions,
+    jump_hash,
+    partition_for,
+    partition_queue,
+)
+
+
+KEYS = [f"key-{i}" for i in range(10_000)]
+
+
+def test_partition_for_is_stable():
+    """Test that a key always maps to the same partition."""
+    first = [partition_for(key, 8) for key in KEYS]
+    second = [partition_for(key, 8) for key in KEYS]
+    assert first == second
+    assert partition_for("key-1", 8) == partition_for(b"key-1", 8)
+
+
+def test_partition_for_spreads_keys():
+    """Test that keys are spread roughly evenly over all partitions."""
+    counts = [0] * 8
+    for key in KEYS:
+        counts[partition_for(key, 8)] += 1
+
+    expected = len(KEYS) / 8
+    assert all(0.8 * expected < count < 1.2 * expected for count in counts)
+
+
+def test_adding_a_partition_moves_few_keys():
+    """
+    Test that going from n to n + 1 partitions only moves about 1 / (n + 1)
+    of the keys, all of them to the new partition.
+    """
+    moved = [
+        key for key in KEYS if partition_for(key, 8) != partition_for(key, 9)
+    ]
+
+    assert len(moved) < 1.2 * len(KEYS) / 9
+    assert all(partition_for(key, 9) == 8 for key in moved)
+
+
+def test_jump_hash_single_bucket():
+    """Test that everything maps to the only bucket."""
+    assert {jump_hash(key, 1) for key in range(1000)} == {0}
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 8, 11])
+def test_claims_cover_every_partition_once(count):
+    """Test that the instances together claim each partition exactly once."""
+    claimed = [
+        partition
+        for index in range(count)
+        for partition in claim_partitions(index, count, 8)
+    ]
+    assert sorted(claimed) == list(range(8))
+
+
+def test_claims_are_round_robin():
+    """Test that partitions are dealt out round-robin."""
+    assert claim_partitions(1, 3, 8) == [1, 4, 7]
+
+
+@pytest.mark.parametrize("index, count", [(-1, 2), (2, 2), (0, 0)])
+def test_claim_with_out_of_range_index(index, count):
+    """Test that an index outside of [0, count) is rejected."""
+    with pytest.raises(ValueError, match="not in"):
+        claim_partitions(index, count, 8)
+
+
+def test_partition_queue():
+    """Test the name of a partition queue."""
+    assert partition_queue("counts", 3) == "counts.3"
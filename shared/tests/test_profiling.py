@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+
+from commons.profiling import EventLoopMonitor, SamplingProfiler
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_monitor_logs_stack_of_blocking_call(caplog):
+    """
+    Test that blocking the loop is measured as lag, and that the watchdog
+    logs the stack of the blocking call while the loop is stuck.
+    """
+    caplog.set_level(logging.WARNING, logger="commons.profiling")
+    monitor = EventLoopMonitor(interval=0.02, threshold=0.05)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.05)
+    finally:
+        monitor.stop()
+
+    blocked = [
+        r.getMessage()
+        for r in caplog.records
+        if r.getMessage().startswith("Event loop blocked")
+    ]
+    assert len(blocked) == 1
+    assert "block_the_loop" in blocked[0]
+    assert monitor.max_lag >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_monitor_quiet_when_loop_is_free(caplog):
+    """Test that nothing is logged while the loop keeps up."""
+    caplog.set_level(logging.WARNING, logger="commons.profiling")
+    monitor = EventLoopMonitor(interval=0.02, threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.2)
+    finally:
+        monitor.stop()
+
+    assert caplog.records == []
+    assert set(monitor.stats()) == {"last_lag", "max_lag"}
+
+
+def test_profiler_writes_folded_stacks(tmp_path):
+    """Test that the profiler samples a thread and writes folded stacks."""
+    profiler = SamplingProfiler(interval=0.001, output_dir=tmp_path)
+    done = threading.Event()
+
+    def busy():
+        while not done.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    profiler.start(thread_id=thread.ident)
+    time.sleep(0.1)
+    path = profiler.stop()
+    done.set()
+    thread.join()
+
+    lines = path.read_text().splitlines()
+    assert lines
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("busy (" in line for line in lines)
+    assert profiler.stop() is None
@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import pytest
+
+from commons.rabbitmq_utils import (
+    claim_partitions,
+    rabbitmq_consumer,
+    send_to_exchange,
+)
+from commons.rabbitmq_utils import rabbitmq_utils
+from commons.rabbitmq_utils.partitioning import partition_for
+from commons.tracing import PUBLISHED_AT_HEADER
+
+# Mark all tests in this file as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def channel(mocker):
+    """
+    Fixture that patches make_connection to hand out a mocked connection, and
+    returns the mocked channel opened on it.
+    """
+    channel = mocker.AsyncMock()
+    connection = mocker.MagicMock()
+    connection.__aenter__ = mocker.AsyncMock(return_value=connection)
+    connection.__aexit__ = mocker.AsyncMock(return_value=None)
+    connection.channel = mocker.AsyncMock(return_value=channel)
+    mocker.patch(
+        "commons.rabbitmq_utils.rabbitmq_utils.make_connection",
+        mocker.AsyncMock(return_value=connection),
+    )
+    return channel
+
+
+@pytest.fixture
+def partitions(mocker):
+    """Fixture that splits queues into 4 partitions."""
+    mocker.patch(
+        "commons.rabbitmq_utils.rabbitmq_utils.settings.rabbitmq_partitions", 4
+    )
+    return 4
+
+
+def published_routing_key(channel) -> str:
+    exchange = channel.declare_exchange.return_value
+    return exchange.publish.call_args.kwargs["routing_key"]
+
+
+async def test_send_unpartitioned(channel):
+    """Test that messages go to the queue itself without partitioning."""
+    await send_to_exchange("message", "counts", partition_key="user-1")
+    assert published_routing_key(channel) == "counts"
+
+
+async def test_send_to_partition_of_key(channel, partitions):
+    """Test that messages go to the partition their key hashes to."""
+    await send_to_exchange("message", "counts", partition_key="user-1")
+
+    expected = partition_for("user-1", partitions)
+    assert published_routing_key(channel) == f"counts.{expected}"
+
+
+async def test_send_without_key_to_fixed_partition(channel, partitions):
+    """Test that messages without a key all go to partition 0."""
+    for _ in range(5):
+        await send_to_exchange("message", "counts")
+        assert published_routing_key(channel) == "counts.0"
+
+
+async def test_publish_timestamp_excludes_connecting(channel, mocker):
+    """
+    Test that the publish timestamp is taken after connecting, so a slow
+    connection is not counted as time waiting in the queue.
+    """
+    make_connection = rabbitmq_utils.make_connection
+    connection = make_connection.return_value
+
+    async def slow_connection():
+        await asyncio.sleep(0.05)
+        return connection
+
+    make_connection.side_effect = slow_connection
+
+    start_ns = time.time_ns()
+    await send_to_exchange("message", "counts")
+
+    exchange = channel.declare_exchange.return_value
+    message = exchange.publish.call_args.args[0]
+    published_at = message.headers[PUBLISHED_AT_HEADER]
+    assert (published_at - start_ns) / 1e9 >= 0.05
+
+
+async def test_claim_partitions_unpartitioned():
+    """Test that nothing is claimed without partitioning."""
+    assert claim_partitions(0, 1) is None
+
+
+async def test_claim_partitions_more_instances_than_partitions(partitions):
+    """Test that instances that would claim no partitions are rejected."""
+    assert claim_partitions(3, partitions) == [3]
+    with pytest.raises(ValueError, match="RABBITMQ_PARTITIONS"):
+        claim_partitions(4, partitions + 1)
+
+
+async def test_consume_claimed_partitions(channel, partitions, mocker):
+    """
+    Test that each claimed partition is declared and consumed one message at
+    a time by a single active consumer.
+    """
+    consumer = asyncio.create_task(
+        rabbitmq_consumer("counts", mocker.AsyncMock(), claim_partitions(1, 2))
+    )
+    await asyncio.sleep(0.01)
+    consumer.cancel()
+
+    declared = [
+        (call.args[0], call.kwargs["arguments"])
+        for call in channel.declare_queue.call_args_list
+    ]
+    assert declared == [
+        ("counts.1", {"x-single-active-consumer": True}),
+        ("counts.3", {"x-single-active-consumer": True}),
+    ]
+    channel.set_qos.assert_called_with(prefetch_count=1)
+    assert channel.set_qos.call_count == 2
+
+
+async def test_consume_unpartitioned(channel, mocker):
+    """Test that the queue itself is consumed without partitioning."""
+    consumer = asyncio.create_task(
+        rabbitmq_consumer("counts", mocker.AsyncMock())
+    )
+    await asyncio.sleep(0.01)
+    consumer.cancel()
+
+    channel.declare_queue.assert_called_once_with(
+        "counts", durable=True, arguments=None
+    )
+    channel.set_qos.assert_not_called()
+
+
+async def test_consume_partitions_with_prefetch(channel, partitions, mocker):
+    """Test that partitions allow RABBITMQ_PARTITION_PREFETCH in flight."""
+    mocker.patch(
+        "commons.rabbitmq_utils.rabbitmq_utils.settings"
+        ".rabbitmq_partition_prefetch",
+        8,
+    )
+    consumer = asyncio.create_task(
+        rabbitmq_consumer("counts", mocker.AsyncMock(), claim_partitions(0, 1))
+    )
+    await asyncio.sleep(0.01)
+    consumer.cancel()
+
+    channel.set_qos.assert_called_with(prefetch_count=8)
+    assert channel.set_qos.call_count == partitions
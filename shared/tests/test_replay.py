@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import time
+
+import pytest
+
+from commons.replay import (
+    ReplayMessage,
+    capture,
+    read_messages,
+    replay,
+)
+from commons.replay.replay import percentile
+from commons.tracing import PUBLISHED_AT_HEADER
+
+
+def make_messages(n: int, spacing_ns: int = 0) -> list[ReplayMessage]:
+    return [
+        ReplayMessage(
+            body=json.dumps({"count": i}).encode("utf-8"),
+            headers={"x-trace-id": f"trace-{i}"},
+            routing_key="counts",
+            timestamp_ns=i * spacing_ns,
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize("body", [b'{"count":1}', b"\x80\xc2binary"])
+def test_record_round_trip(body):
+    """Test that messages survive being written and read back as records."""
+    message = ReplayMessage(
+        body=body, headers={"a": 1}, routing_key="counts", timestamp_ns=42
+    )
+
+    record = json.loads(json.dumps(message.to_record()))
+
+    assert ReplayMessage.from_record(record) == message
+
+
+def test_binary_body_is_base64():
+    """Test that bodies that are not UTF-8 are stored as base64."""
+    record = ReplayMessage(b"\x80", {}, "counts", 0).to_record()
+    assert record["body_b64"] == "gA=="
+    assert "body" not in record
+
+
+def test_bytes_headers_are_base64():
+    """Test that bytes header values survive a record round trip as bytes."""
+    message = ReplayMessage(
+        b"{}", {"x-trace-id": b"\x80abc", "a": 1}, "counts", 0
+    )
+
+    record = json.loads(json.dumps(message.to_record()))
+
+    assert record["headers"] == {"a": 1}
+    assert record["headers_b64"] == {"x-trace-id": "gGFiYw=="}
+    assert ReplayMessage.from_record(record) == message
+
+
+def test_read_messages_skips_blank_lines(tmp_path):
+    """Test reading a capture file, ignoring blank lines."""
+    messages = make_messages(3)
+    path = tmp_path / "capture.jsonl"
+    path.write_text(
+        "\n".join(json.dumps(m.to_record()) for m in messages) + "\n\n"
+    )
+
+    assert list(read_messages(path)) == messages
+
+
+def test_percentile():
+    """Test the nearest-rank percentile."""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile([], 50) == 0.0
+    assert percentile([3.0], 99) == 3.0
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 90) == 90.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+
+
+@pytest.mark.asyncio
+async def test_replay_counts_messages_and_errors(caplog):
+    """Test that replay handles every message and counts failures."""
+    handled = []
+
+    async def handler(message):
+        handled.append(message.body)
+        if b'"count": 2' in message.body:
+            raise ValueError("bad message")
+
+    report = await replay(iter(make_messages(5)), handler, concurrency=2)
+
+    assert len(handled) == 5
+    assert report.messages == 5
+    assert report.errors == 1
+    assert len(report.latencies) == 5
+    summary = report.summary()
+    assert summary["throughput"] > 0
+    assert summary["latency_p50"] <= summary["latency_max"]
+    assert any(
+        r.levelno == logging.WARNING and "bad message" in r.getMessage()
+        for r in caplog.records
+    )
+
+
+@pytest.mark.asyncio
+async def test_replay_limits_concurrency():
+    """Test that no more than `concurrency` messages are handled at once."""
+    in_flight = 0
+    most_in_flight = 0
+
+    async def handler(message):
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    await replay(iter(make_messages(10)), handler, concurrency=3)
+
+    assert most_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_captured_rate():
+    """Test that messages are replayed at a multiple of the captured rate."""
+
+    async def handler(message):
+        pass
+
+    # 5 messages 100ms apart take 400ms as captured, 200ms at double speed.
+    messages = make_messages(5, spacing_ns=100_000_000)
+    report = await replay(iter(messages), handler, speed=2)
+    assert 0.18 < report.duration < 0.35
+
+    report = await replay(iter(messages), handler)
+    assert report.duration < 0.1
+
+
+@pytest.mark.asyncio
+async def test_replay_latency_includes_falling_behind():
+    """
+    Test that latencies are measured from when each message was due, so a
+    handler that cannot keep up with the replay rate shows growing latencies.
+    """
+
+    async def handler(message):
+        await asyncio.sleep(0.05)
+
+    # Messages are due every 10ms but each one takes 50ms, so message i waits
+    # about 40ms longer than the one before it.
+    messages = make_messages(5, spacing_ns=10_000_000)
+    report = await replay(iter(messages), handler, speed=1, concurrency=1)
+
+    assert report.latencies == sorted(report.latencies)
+    assert report.latencies[0] < 0.1
+    assert report.latencies[-1] > 0.2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "kwargs", [{"speed": 0}, {"speed": -1}, {"concurrency": 0}]
+)
+async def test_replay_rejects_invalid_arguments(kwargs):
+    """Test that a speed or concurrency that is not positive is rejected."""
+
+    async def handler(message):
+        pass
+
+    with pytest.raises(ValueError):
+        await replay(iter(make_messages(1)), handler, **kwargs)
+
+
+class FakeQueueIterator:
+    """Stands in for `queue.iterator()`, yielding the given messages."""
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    async def __aiter__(self):
+        for message in self.messages:
+            yield message
+
+
+def incoming_message(mocker, body: bytes, headers: dict):
+    msg = mocker.MagicMock()
+    msg.body = body
+    msg.headers = headers
+    msg.routing_key = "counts"
+    return msg
+
+
+@pytest.mark.asyncio
+async def test_capture_writes_messages(tmp_path, mocker):
+    """
+    Test that captured messages are written as records, that bytes headers
+    are kept as bytes and that a malformed publish timestamp falls back to
+    the time the message was captured.
+    """
+    received = [
+        incoming_message(
+            mocker,
+            b'{"count":1}',
+            {PUBLISHED_AT_HEADER: 5, "x-trace-id": b"abc"},
+        ),
+        incoming_message(
+            mocker, b'{"count":2}', {PUBLISHED_AT_HEADER: "garbage"}
+        ),
+        incoming_message(mocker, b'{"count":3}', {}),
+    ]
+    queue = mocker.MagicMock()
+    queue.bind = mocker.AsyncMock()
+    queue.iterator.return_value = FakeQueueIterator(received)
+    channel = mocker.AsyncMock()
+    channel.declare_queue.return_value = queue
+    connection = mocker.MagicMock()
+    connection.__aenter__ = mocker.AsyncMock(return_value=connection)
+    connection.__aexit__ = mocker.AsyncMock(return_value=None)
+    connection.channel = mocker.AsyncMock(return_value=channel)
+    mocker.patch(
+        "commons.rabbitmq_utils.rabbitmq_utils.make_connection",
+        mocker.AsyncMock(return_value=connection),
+    )
+    path = tmp_path / "capture.jsonl"
+
+    start_ns = time.time_ns()
+    await capture(path, ["counts.0", "counts.1"], limit=2)
+
+    bound = [call.kwargs["routing_key"] for call in queue.bind.call_args_list]
+    assert bound == ["counts.0", "counts.1"]
+    messages = list(read_messages(path))
+    assert [m.body for m in messages] == [b'{"count":1}', b'{"count":2}']
+    assert messages[0].headers["x-trace-id"] == b"abc"
+    assert messages[0].timestamp_ns == 5
+    assert messages[1].timestamp_ns >= start_ns
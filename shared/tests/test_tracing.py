@@ -0,0 +1,213 @@
+import logging
+
+import pytest
+
+from commons.rabbitmq_utils import traced_handler
+from commons.tracing.tracing import latency_histograms
+from commons.tracing import (
+    PUBLISHED_AT_HEADER,
+    RECEIVED_AT_HEADER,
+    TRACE_ID_HEADER,
+    Histogram,
+    TraceIdFilter,
+    api_seconds,
+    get_trace_id,
+    is_valid_trace_id,
+    make_trace_headers,
+    queue_wait_seconds,
+    received_at_var,
+    trace_id_var,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_histograms():
+    """Fixture to start each test without recorded latencies."""
+    latency_histograms.clear()
+    yield
+    latency_histograms.clear()
+
+
+def test_histogram_snapshot():
+    """Test that the snapshot has cumulative bucket counts, count and sum."""
+    hist = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        hist.observe(value)
+
+    assert hist.snapshot() == {
+        "buckets": {"0.1": 2, "1.0": 3, "+Inf": 4},
+        "count": 4,
+        "sum": pytest.approx(2.65),
+    }
+
+
+def test_histogram_quantile():
+    """Test that quantiles report the upper bound of their bucket."""
+    hist = Histogram(buckets=(0.1, 1.0))
+    assert hist.quantile(0.5) == 0.0
+
+    for value in (0.05, 0.5, 0.5, 2.0):
+        hist.observe(value)
+
+    assert hist.quantile(0.25) == 0.1
+    assert hist.quantile(0.5) == 1.0
+    assert hist.quantile(1.0) == float("inf")
+
+
+def test_queue_wait_seconds(mocker):
+    """Test the queue wait, including missing headers and clock skew."""
+    mocker.patch("commons.tracing.tracing.time.time_ns", return_value=3e9)
+
+    assert queue_wait_seconds(None) is None
+    assert queue_wait_seconds({}) is None
+    assert queue_wait_seconds({PUBLISHED_AT_HEADER: 1_000_000_000}) == 2.0
+    # Published "after" it was received, because the clocks disagree.
+    assert queue_wait_seconds({PUBLISHED_AT_HEADER: 4_000_000_000}) == 0.0
+
+
+def test_api_seconds():
+    """Test the time between receiving the request and publishing."""
+    assert api_seconds({PUBLISHED_AT_HEADER: 1}) is None
+    assert api_seconds({RECEIVED_AT_HEADER: 1}) is None
+    assert (
+        api_seconds(
+            {RECEIVED_AT_HEADER: 1_000_000_000, PUBLISHED_AT_HEADER: 1.5e9}
+        )
+        == 0.5
+    )
+
+
+def test_make_trace_headers_uses_context():
+    """Test that the trace id and receive time of the context are used."""
+    trace_token = trace_id_var.set("abc")
+    received_token = received_at_var.set(123)
+    try:
+        headers = make_trace_headers()
+    finally:
+        received_at_var.reset(received_token)
+        trace_id_var.reset(trace_token)
+
+    assert headers[TRACE_ID_HEADER] == "abc"
+    assert headers[RECEIVED_AT_HEADER] == 123
+    assert PUBLISHED_AT_HEADER in headers
+
+    headers = make_trace_headers()
+    assert headers[TRACE_ID_HEADER] != "abc"
+    assert RECEIVED_AT_HEADER not in headers
+
+
+@pytest.mark.parametrize(
+    "trace_id, valid",
+    [
+        ("abc123", True),
+        ("0123456789abcdef0123456789ABCDEF", True),
+        ("123e4567-e89b-12d3-a456-426614174000", True),
+        ("", False),
+        ("a" * 33, False),
+        ("abc\nINFO forged log line", False),
+        ("not-a-trace-id", False),
+    ],
+)
+def test_is_valid_trace_id(trace_id, valid):
+    """Test that only short hex strings and UUIDs are valid trace ids."""
+    assert is_valid_trace_id(trace_id) is valid
+
+
+def test_trace_id_filter():
+    """Test that records get the current trace id, or `-` without one."""
+    record = logging.LogRecord("test", logging.INFO, "", 0, "msg", None, None)
+    TraceIdFilter().filter(record)
+    assert record.trace_id == "-"
+    assert not hasattr(record, "labels")
+
+    token = trace_id_var.set("abc")
+    try:
+        TraceIdFilter().filter(record)
+    finally:
+        trace_id_var.reset(token)
+    assert record.trace_id == "abc"
+    assert record.labels == {"trace_id": "abc"}
+
+
+def test_trace_id_filter_keeps_labels():
+    """Test that the trace id label is added to labels passed as extra."""
+    labels = {"user": "1"}
+    record = logging.LogRecord("test", logging.INFO, "", 0, "msg", None, None)
+    record.labels = labels
+
+    token = trace_id_var.set("abc")
+    try:
+        TraceIdFilter().filter(record)
+    finally:
+        trace_id_var.reset(token)
+    assert record.labels == {"user": "1", "trace_id": "abc"}
+    assert labels == {"user": "1"}
+
+
+@pytest.mark.asyncio
+async def test_traced_handler_sets_and_resets_trace_id(mocker):
+    """
+    Test that the handler runs with the message's trace id, that it is reset
+    afterwards and that the latencies are recorded for the queue.
+    """
+    seen_trace_ids = []
+
+    async def handler(msg):
+        seen_trace_ids.append(get_trace_id())
+
+    msg = mocker.MagicMock()
+    msg.headers = {
+        TRACE_ID_HEADER: "abc",
+        RECEIVED_AT_HEADER: 1,
+        PUBLISHED_AT_HEADER: 2,
+    }
+
+    await traced_handler("counts", handler)(msg)
+
+    assert seen_trace_ids == ["abc"]
+    assert get_trace_id() is None
+    assert set(latency_histograms["counts"]) == {
+        "api",
+        "queue_wait",
+        "handler",
+    }
+
+
+@pytest.mark.asyncio
+async def test_traced_handler_records_failures(mocker):
+    """Test that the handler time is recorded even if the handler raises."""
+
+    async def handler(msg):
+        raise ValueError("bad message")
+
+    msg = mocker.MagicMock()
+    msg.headers = None
+
+    with pytest.raises(ValueError):
+        await traced_handler("counts", handler)(msg)
+
+    assert get_trace_id() is None
+    assert latency_histograms["counts"]["handler"].count == 1
+    assert "queue_wait" not in latency_histograms["counts"]
+
+
+@pytest.mark.asyncio
+async def test_traced_handler_ignores_garbage_timestamps(mocker):
+    """
+    Test that malformed timestamp headers count as missing, and that the
+    handler still runs so the message gets acked or rejected.
+    """
+    handler = mocker.AsyncMock()
+    msg = mocker.MagicMock()
+    msg.headers = {
+        RECEIVED_AT_HEADER: "yesterday",
+        PUBLISHED_AT_HEADER: b"\x00",
+    }
+
+    assert queue_wait_seconds(msg.headers) is None
+    assert api_seconds(msg.headers) is None
+
+    await traced_handler("counts", handler)(msg)
+
+    handler.assert_awaited_once_with(msg)
+    assert set(latency_histograms["counts"]) == {"handler"}